@@ -0,0 +1,460 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from mqt.predictor import utils
+
+
+def get_qasm_hash(qasm_str: str):
+    """Returns a hash of a qasm string that does not depend on comments, indentation, whitespace or line endings."""
+    lines = []
+    for line in qasm_str.splitlines():
+        line = " ".join(line.split("//", 1)[0].split())
+        if line:
+            lines.append(line)
+    return hashlib.sha256("\n".join(lines).encode()).hexdigest()
+
+
+class FeatureCache:
+    """Content-addressed cache of feature dictionaries keyed by the normalized hash of the qasm circuit.
+
+    Recently used features are kept in an in-memory LRU tier. If a path is given, all features are additionally
+    stored in an SQLite database which is shared across processes and runs. Cached features of another feature
+    schema version are dropped when the database is opened.
+    """
+
+    def __init__(
+        self,
+        path: str = None,
+        max_memory_entries: int = 4096,
+        max_disk_bytes: int = 256 * 1024**2,
+        schema_version: int = None,
+    ):
+        """Keyword arguments:
+        path -- path to the SQLite database of the on-disk tier, no on-disk tier is used if not provided
+        max_memory_entries -- maximum number of feature dictionaries held in memory
+        max_disk_bytes -- maximum size of all serialized feature dictionaries held on disk
+        schema_version -- feature schema version, defaults to utils.get_feature_schema_version()
+        """
+        if schema_version is None:
+            schema_version = utils.get_feature_schema_version()
+        self.schema_version = schema_version
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.connection = None
+        if path is not None:
+            self.connection = sqlite3.connect(str(path), check_same_thread=False)
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS features (key TEXT PRIMARY KEY, schema_version INTEGER, "
+                    "features TEXT, size INTEGER, last_access REAL)"
+                )
+                self.connection.execute(
+                    "CREATE INDEX IF NOT EXISTS features_last_access ON features (last_access)"
+                )
+                self.connection.execute(
+                    "DELETE FROM features WHERE schema_version != ?",
+                    (self.schema_version,),
+                )
+            self.disk_size = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM features"
+            ).fetchone()[0]
+
+    def get_key(self, qasm_str_or_path: str):
+        """Returns the cache key for a qasm file path or qasm string and None if neither is provided."""
+        qasm_str = utils.read_qasm_str(qasm_str_or_path)
+        if qasm_str is None:
+            return None
+        return get_qasm_hash(qasm_str)
+
+    def get(self, key: str):
+        """Returns the cached feature dictionary for a key and None if it is not cached."""
+        if key is None:
+            return None
+
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return dict(self.memory[key])
+
+            if self.connection is None:
+                return None
+
+            row = self.connection.execute(
+                "SELECT features FROM features WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE features SET last_access = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+            feature_dict = json.loads(row[0])
+            self.add_to_memory(key, feature_dict)
+            return dict(feature_dict)
+
+    def put(self, key: str, feature_dict: dict):
+        """Stores a feature dictionary in all tiers and evicts the least recently used entries if necessary."""
+        if key is None:
+            return
+
+        with self.lock:
+            self.add_to_memory(key, dict(feature_dict))
+            if self.connection is None:
+                return
+
+            serialized = json.dumps(feature_dict)
+            with self.connection:
+                row = self.connection.execute(
+                    "SELECT size FROM features WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self.disk_size -= row[0]
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        self.schema_version,
+                        serialized,
+                        len(serialized),
+                        time.time(),
+                    ),
+                )
+                self.disk_size += len(serialized)
+                if self.disk_size > self.max_disk_bytes:
+                    self.evict_from_disk()
+
+    def add_to_memory(self, key: str, feature_dict: dict):
+        self.memory[key] = feature_dict
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def evict_from_disk(self):
+        # Other processes may share the database, hence the stored size is determined again
+        self.disk_size = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM features"
+        ).fetchone()[0]
+        # Evict slightly more than necessary so that not every following insertion triggers an eviction
+        target_size = 0.9 * self.max_disk_bytes
+        rows = self.connection.execute(
+            "SELECT key, size FROM features ORDER BY last_access"
+        )
+        to_be_evicted = []
+        for key, size in rows:
+            if self.disk_size <= target_size:
+                break
+            to_be_evicted.append((key,))
+            self.disk_size -= size
+        self.connection.executemany("DELETE FROM features WHERE key = ?", to_be_evicted)
+
+    def clear(self):
+        """Removes all entries from all tiers."""
+        with self.lock:
+            self.memory.clear()
+            if self.connection is not None:
+                with self.connection:
+                    self.connection.execute("DELETE FROM features")
+                self.disk_size = 0
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __len__(self):
+        with self.lock:
+            if self.connection is None:
+                return len(self.memory)
+            return self.connection.execute("SELECT COUNT(*) FROM features").fetchone()[
+                0
+            ]
+
+
+class CompiledCircuitStore:
+    """On-disk store of compiled circuits as qasm files keyed by the hash of the original circuit, the compilation
+    path (LUT index) and the calibration version of the targeted device. All files are written atomically so that
+    concurrent workers may share one store."""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get_path(self, circuit_hash: str, comp_path_index: int):
+        """Returns the path of the stored compiled circuit for a circuit hash and a compilation path."""
+        device = utils.get_index_to_comppath_LUT()[comp_path_index][1]
+        calibration_version = utils.get_device_calibrations()[device].version
+        key = hashlib.sha256(
+            f"{circuit_hash}-{comp_path_index}-{calibration_version}".encode()
+        ).hexdigest()
+        return self.directory / (key + ".qasm")
+
+    def get(self, circuit_hash: str, comp_path_index: int):
+        """Returns the stored compiled qasm string and None if it has not been stored yet."""
+        path = self.get_path(circuit_hash, comp_path_index)
+        try:
+            return path.read_text()
+        except FileNotFoundError:
+            return None
+
+    def put(self, circuit_hash: str, comp_path_index: int, compiled_qasm: str):
+        """Stores a compiled qasm string by writing a temporary file and atomically renaming it."""
+        path = self.get_path(circuit_hash, comp_path_index)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(compiled_qasm)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+
+def get_file_hash(path: str):
+    """Returns the sha256 hash of the content of a file."""
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+class CompilationManifest:
+    """SQLite ledger of the compilation results of all (circuit, compilation path) pairs of the training data
+    generation, which allows interrupted or extended runs to be resumed by only compiling missing or stale pairs.
+
+    For each pair, the status ("success", "timeout" or "failure"), the duration, the timeout limit, the hash of the
+    source circuit and the hash of the compiled circuit are recorded.
+    """
+
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(path), check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS compilations (circuit TEXT, comp_path_id INTEGER, status TEXT, "
+                "duration REAL, timeout REAL, source_hash TEXT, output_hash TEXT, PRIMARY KEY (circuit, comp_path_id))"
+            )
+
+    def record(
+        self,
+        circuit: str,
+        comp_path_id: int,
+        status: str,
+        duration: float,
+        timeout: float,
+        source_hash: str,
+        output_hash: str = None,
+    ):
+        """Records the result of compiling a circuit with a compilation path, replacing any previous result."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO compilations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    circuit,
+                    comp_path_id,
+                    status,
+                    duration,
+                    timeout,
+                    source_hash,
+                    output_hash,
+                ),
+            )
+
+    def get(self, circuit: str, comp_path_id: int):
+        """Returns the recorded result as a dictionary and None if nothing has been recorded."""
+        with self.lock:
+            cursor = self.connection.execute(
+                "SELECT * FROM compilations WHERE circuit = ? AND comp_path_id = ?",
+                (circuit, comp_path_id),
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([column[0] for column in cursor.description], row))
+
+    def get_all(self):
+        """Returns a dictionary mapping all recorded (circuit, comp_path_id) pairs to their result dictionary."""
+        with self.lock:
+            cursor = self.connection.execute("SELECT * FROM compilations")
+            rows = cursor.fetchall()
+        columns = [column[0] for column in cursor.description]
+        return {(row[0], row[1]): dict(zip(columns, row)) for row in rows}
+
+    def needs_compilation(
+        self,
+        entry: dict,
+        source_hash: str,
+        output_path: str,
+        timeout: float,
+    ):
+        """Returns whether a (circuit, compilation path) pair must be compiled (again) given its recorded result.
+
+        Keyword arguments:
+        entry -- recorded result of the pair, None if nothing has been recorded
+        source_hash -- current hash of the source circuit
+        output_path -- path of the compiled circuit
+        timeout -- current timeout limit in seconds
+
+        Return values:
+        True -- nothing has been recorded, the source circuit has changed, the compiled circuit is missing or differs
+        from the recorded one, or the compilation timed out with a smaller timeout limit
+        False -- otherwise
+        """
+        if entry is None or entry["source_hash"] != source_hash:
+            return True
+        if entry["status"] == "success":
+            return (
+                not Path(output_path).exists()
+                or get_file_hash(output_path) != entry["output_hash"]
+            )
+        if entry["status"] == "timeout":
+            return entry["timeout"] < timeout
+        return False
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM compilations"
+            ).fetchone()[0]
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class GateArrayStore:
+    """Compact on-disk store of compiled circuits as gate arrays (see utils.get_gate_arrays), which allows to
+    evaluate them for new device calibrations without reading and parsing their qasm files again.
+
+    All circuits are stored column-wise in raw binary files: per circuit its name, compilation path index, number
+    of operations and the hash of its qasm file, and per operation its gate index and the indices of its qubits.
+    New circuits are appended. If a circuit is stored multiple times, e.g., since it has been compiled again, its
+    latest entry is used.
+    """
+
+    circuit_columns = {
+        "names": "S128",
+        "comp_path_indices": "<i2",
+        "num_gates": "<i8",
+        "file_hashes": "S64",
+    }
+    gate_columns = {
+        "gate_ids": "<i1",
+        "first_qubits": "<i2",
+        "second_qubits": "<i2",
+    }
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def get_meta(self):
+        meta_path = self.directory / "meta.json"
+        if meta_path.is_file():
+            return json.loads(meta_path.read_text())
+        return {
+            "num_circuits": 0,
+            "num_gates": 0,
+            "gate_names": utils.get_score_gate_names(),
+        }
+
+    def append(self, entries: list):
+        """Appends a list of (name, comp_path_index, file_hash, (gate_ids, first_qubits, second_qubits)) entries."""
+        if not entries:
+            return
+        meta = self.get_meta()
+        names, comp_path_indices, file_hashes, gate_arrays = zip(*entries)
+        circuit_columns = {
+            "names": names,
+            "comp_path_indices": comp_path_indices,
+            "num_gates": [len(gate_ids) for gate_ids, _, _ in gate_arrays],
+            "file_hashes": file_hashes,
+        }
+        gate_columns = {
+            column: np.concatenate([arrays[i] for arrays in gate_arrays])
+            for i, column in enumerate(self.gate_columns)
+        }
+
+        for column, dtype in self.circuit_columns.items():
+            utils.append_to_column_file(
+                self.directory / (column + ".bin"),
+                circuit_columns[column],
+                dtype,
+                meta["num_circuits"],
+            )
+        for column, dtype in self.gate_columns.items():
+            utils.append_to_column_file(
+                self.directory / (column + ".bin"),
+                gate_columns[column],
+                dtype,
+                meta["num_gates"],
+            )
+        meta["num_circuits"] += len(entries)
+        meta["num_gates"] += len(gate_columns["gate_ids"])
+        utils.write_column_store_meta(self.directory, meta)
+
+    def load(self):
+        """Returns a dictionary of all columns as read-only memory maps together with the "offsets" of the operations
+        of each circuit (circuit i spans offsets[i] to offsets[i + 1]) and the "latest" entry index of each
+        (name, comp_path_index) pair."""
+        meta = self.get_meta()
+        columns = {}
+        for column_dtypes, length in [
+            (self.circuit_columns, meta["num_circuits"]),
+            (self.gate_columns, meta["num_gates"]),
+        ]:
+            for column, dtype in column_dtypes.items():
+                if length == 0:
+                    columns[column] = np.empty(length, dtype=dtype)
+                else:
+                    columns[column] = np.memmap(
+                        self.directory / (column + ".bin"),
+                        dtype=dtype,
+                        mode="r",
+                        shape=(length,),
+                    )
+        columns["offsets"] = np.concatenate([[0], np.cumsum(columns["num_gates"])])
+        columns["latest"] = {
+            (name.decode(), int(comp_path_index)): i
+            for i, (name, comp_path_index) in enumerate(
+                zip(columns["names"], columns["comp_path_indices"])
+            )
+        }
+        return columns
+
+    def get_gate_arrays(self, columns: dict, entries: np.ndarray):
+        """Returns the concatenated gate arrays of a list of entry indices of the loaded columns (see load) together
+        with their offsets."""
+        entries = np.asarray(entries, dtype=np.int64)
+        num_gates = np.asarray(columns["num_gates"])[entries]
+        offsets = np.concatenate([[0], np.cumsum(num_gates)])
+        # Index of each operation of the selected entries within the stored operations
+        gate_indices = np.repeat(
+            columns["offsets"][entries] - offsets[:-1], num_gates
+        ) + np.arange(offsets[-1])
+        return (
+            columns["gate_ids"][gate_indices],
+            columns["first_qubits"][gate_indices],
+            columns["second_qubits"][gate_indices],
+            offsets,
+        )
+
+    def get_file_hashes(self):
+        """Returns a dictionary mapping each stored (name, comp_path_index) pair to the hash of its qasm file."""
+        columns = self.load()
+        return {
+            key: columns["file_hashes"][i].decode()
+            for key, i in columns["latest"].items()
+        }
@@ -1,18 +1,32 @@
+from __future__ import annotations
+
 import argparse
-import glob
+import json
+import os
 import sys
+import tempfile
+import time
 from pathlib import Path
 
 import matplotlib.pyplot as plt
 import numpy as np
-from joblib import Parallel, delayed, load
+from joblib import Parallel, delayed, effective_n_jobs
 from mqt.bench.utils import qiskit_helper, tket_helper
+from pytket import Circuit
 from pytket.qasm import circuit_to_qasm_str
 from qiskit import QuantumCircuit
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import GridSearchCV, train_test_split
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import (
+    GridSearchCV,
+    HalvingGridSearchCV,
+    ParameterGrid,
+    ParameterSampler,
+    train_test_split,
+)
 
-from mqt.predictor import utils
+from mqt.predictor import cache, utils
 
 if sys.version_info < (3, 10, 0):
     import importlib_resources as resources
@@ -23,11 +37,41 @@ plt.rcParams["font.family"] = "Times New Roman"
 
 
 class Predictor:
-    def __init__(self):
+    def __init__(self, feature_cache=None, compiled_circuit_store=None):
+        """Keyword arguments:
+        feature_cache -- optional FeatureCache (see mqt.predictor.cache) used to skip the feature creation of
+        already seen circuits
+        compiled_circuit_store -- optional CompiledCircuitStore (see mqt.predictor.cache) used to skip the
+        compilation of already compiled circuits
+        """
         self.clf = None
+        self.feature_schema = None
+        self.feature_cache = feature_cache
+        self.compiled_circuit_store = compiled_circuit_store
 
-    def set_classifier(self, clf):
+    def set_classifier(self, clf, feature_schema: utils.FeatureSchema = None):
         self.clf = clf
+        if feature_schema is not None:
+            self.feature_schema = feature_schema
+
+    def load_classifier(self):
+        """Loads the model bundle of the trained classifier and its feature schema once and keeps both resident.
+
+        Return values:
+        True -- classifier and feature schema are available
+        False -- if not
+        """
+        if self.clf is None or self.feature_schema is None:
+            model_bundle = utils.load_model_bundle()
+            if model_bundle is None:
+                print("Fail: Classifier is neither trained nor saved!")
+                return False
+            if self.clf is None:
+                self.clf = model_bundle.clf
+            if self.feature_schema is None:
+                self.feature_schema = model_bundle.feature_schema
+
+        return True
 
     def compile_all_circuits_for_qc(
         self,
@@ -65,66 +109,23 @@ class Predictor:
         if not qc:
             return False
 
-        compilation_pipeline = utils.get_compilation_pipeline()
-
+        device_max_qubits = utils.get_device_max_qubits()
         results = []
-        comp_path_id = 0
         try:
-            for gate_set_name, devices in compilation_pipeline.get("devices").items():
-                for device_name, max_qubits in devices:
-                    for compiler, settings in compilation_pipeline["compiler"].items():
-                        if "qiskit" in compiler:
-                            for opt_level in settings["optimization_level"]:
-                                target_filename = (
-                                    filename.split(".qasm")[0] + "_" + str(comp_path_id)
-                                )
-                                comp_path_id += 1
-                                if max_qubits >= qc.num_qubits:
-                                    tmp = utils.timeout_watcher(
-                                        qiskit_helper.get_mapped_level,
-                                        [
-                                            qc,
-                                            gate_set_name,
-                                            qc.num_qubits,
-                                            device_name,
-                                            opt_level,
-                                            False,
-                                            False,
-                                            target_path,
-                                            target_filename,
-                                        ],
-                                        timeout,
-                                    )
-                                    results.append(tmp)
-                                    if not tmp:
-                                        continue
-                        elif "tket" in compiler:
-                            for lineplacement in settings["lineplacement"]:
-                                target_filename = (
-                                    filename.split(".qasm")[0] + "_" + str(comp_path_id)
-                                )
-                                comp_path_id += 1
-                                if max_qubits >= qc.num_qubits:
-                                    tmp = utils.timeout_watcher(
-                                        tket_helper.get_mapped_level,
-                                        [
-                                            qc,
-                                            gate_set_name,
-                                            qc.num_qubits,
-                                            device_name,
-                                            lineplacement,
-                                            False,
-                                            False,
-                                            target_path,
-                                            target_filename,
-                                        ],
-                                        timeout,
-                                    )
-                                    results.append(tmp)
-                                    if not tmp:
-                                        continue
-
-            if all(x is False for x in results):
+            for comp_path_id, comp_path in utils.get_index_to_comppath_LUT().items():
+                if device_max_qubits[comp_path[1]] >= qc.num_qubits:
+                    results.append(
+                        self.compile_circuit_for_comp_path(
+                            filename,
+                            comp_path_id,
+                            source_path,
+                            target_path,
+                            timeout,
+                            qc,
+                        )
+                    )
+
+            if not any(results):
                 print("No compilation succeeded for this quantum circuit.")
                 return False
             return True
@@ -133,18 +134,119 @@ class Predictor:
             print("fail: ", e)
             return False
 
+    def compile_circuit_for_comp_path(
+        self,
+        filename: str,
+        comp_path_id: int,
+        source_path: str = None,
+        target_path: str = None,
+        timeout: int = 10,
+        qc: QuantumCircuit = None,
+        manifest: cache.CompilationManifest = None,
+        source_hash: str = None,
+    ):
+        """Handles the compilation of one training sample for one compilation path.
+
+        Keyword arguments:
+        filename -- qasm circuit sample filename
+        comp_path_id -- index of the compilation path within the LUT
+        source_path -- path to file
+        target_path -- path to directory for compiled circuit
+        timeout -- timeout in seconds
+        qc -- already parsed quantum circuit, otherwise the file is parsed within the timeout worker process
+        manifest -- compilation manifest in which the result is recorded
+        source_hash -- hash of the circuit file, only needed for the manifest and determined if not provided
+
+        Return values:
+        True -- compilation succeeded
+        False -- if not
+        """
+        if source_path is None:
+            source_path = str(
+                resources.files("mqt.predictor").joinpath("training_samples")
+            )
+
+        if target_path is None:
+            target_path = str(
+                resources.files("mqt.predictor").joinpath("training_samples_compiled")
+            )
+
+        device_name = utils.get_index_to_comppath_LUT()[comp_path_id][1]
+        if qc is None:
+            num_qubits, _num_gates = utils.get_qasm_size(Path(source_path) / filename)
+        else:
+            num_qubits = qc.num_qubits
+        if utils.get_device_max_qubits()[device_name] < num_qubits:
+            return False
+
+        target_filename = filename.split(".qasm")[0] + "_" + str(comp_path_id)
+        # Only the file path is sent if the circuit is not parsed yet, so that it is parsed within the worker process
+        # instead of the GIL-bound calling thread and need not be pickled
+        result = utils.get_timeout_worker().run(
+            compile_to_qasm_file,
+            [
+                str(Path(source_path) / filename) if qc is None else qc,
+                comp_path_id,
+                target_path,
+                target_filename,
+            ],
+            timeout,
+        )
+        if result.status == "timeout":
+            print("Compilation exceeded timeout limit for ", filename, comp_path_id)
+        elif result.status == "error":
+            print("Something else went wrong: ", result.error)
+
+        succeeded = result.succeeded and result.value is not False
+        output_path = Path(target_path) / (target_filename + ".qasm")
+        if manifest is not None:
+            if result.status == "timeout":
+                status = "timeout"
+            else:
+                status = "success" if succeeded else "failure"
+            manifest.record(
+                filename,
+                comp_path_id,
+                status,
+                result.duration,
+                timeout,
+                source_hash or cache.get_file_hash(Path(source_path) / filename),
+                cache.get_file_hash(output_path) if succeeded else None,
+            )
+        return succeeded
+
+    def get_compilation_tasks(self, filenames: list, source_path: str):
+        """Returns all (filename, comp_path_id) compilation tasks ordered from the presumably longest to the shortest
+        one. The expected duration is estimated by the number of qubits and gates of the circuit. Tasks whose device
+        has not enough qubits for the circuit are omitted."""
+        device_max_qubits = utils.get_device_max_qubits()
+        LUT = utils.get_index_to_comppath_LUT()
+
+        tasks = []
+        for filename in filenames:
+            num_qubits, num_gates = utils.get_qasm_size(Path(source_path) / filename)
+            for comp_path_id, comp_path in LUT.items():
+                if device_max_qubits[comp_path[1]] >= num_qubits:
+                    tasks.append((num_qubits * num_gates, filename, comp_path_id))
+
+        tasks.sort(key=lambda task: task[0], reverse=True)
+        return [(filename, comp_path_id) for _, filename, comp_path_id in tasks]
+
     def generate_compiled_circuits(
         self,
         source_path: str = None,
         target_path: str = None,
         timeout: int = 10,
+        manifest_path: str = None,
     ):
-        """Handles the creation of all training samples.
+        """Handles the creation of all training samples. The results are recorded in a compilation manifest so that
+        a rerun only compiles (circuit, compilation path) pairs that are new or whose previous result is stale.
 
         Keyword arguments:
         source_path -- path to file
         target_directory -- path to directory for compiled circuit
         timeout -- timeout in seconds
+        manifest_path -- path to the compilation manifest, defaults to "compilation_manifest.sqlite" in target_path
 
         """
         if source_path is None:
@@ -160,14 +262,8 @@ class Predictor:
         global TIMEOUT
         TIMEOUT = timeout
 
-        source_circuits_list = []
-
-        for file in Path(source_path).iterdir():
-            if "qasm" in str(file):
-                source_circuits_list.append(str(file))
-
         if (
-            len(source_circuits_list) == 0
+            not any(".qasm" in file.name for file in Path(source_path).iterdir())
             and (Path(source_path) / "mqtbench_training_samples.zip").exists()
         ):
             path_zip = str(Path(source_path) / "mqtbench_training_samples.zip")
@@ -176,26 +272,63 @@ class Predictor:
             with zipfile.ZipFile(path_zip, "r") as zip_ref:
                 zip_ref.extractall(source_path)
 
-        if not Path(source_path).is_dir():
-            Path(source_path).mkdir()
+        source_circuits_list = [
+            file.name for file in Path(source_path).iterdir() if ".qasm" in file.name
+        ]
 
-        Parallel(n_jobs=-1, verbose=100)(
-            delayed(self.compile_all_circuits_for_qc)(
-                filename, source_path, target_path, timeout
-            )
+        # Only the pairs that have not been compiled yet or whose result is stale are compiled again
+        manifest = cache.CompilationManifest(
+            manifest_path or Path(target_path) / "compilation_manifest.sqlite"
+        )
+        recorded_results = manifest.get_all()
+        source_hashes = {
+            filename: cache.get_file_hash(Path(source_path) / filename)
             for filename in source_circuits_list
+        }
+        tasks = [
+            (filename, comp_path_id)
+            for filename, comp_path_id in self.get_compilation_tasks(
+                source_circuits_list, source_path
+            )
+            if manifest.needs_compilation(
+                recorded_results.get((filename, comp_path_id)),
+                source_hashes[filename],
+                Path(target_path)
+                / (filename.split(".qasm")[0] + "_" + str(comp_path_id) + ".qasm"),
+                timeout,
+            )
+        ]
+        print("Compilation tasks to be done:", len(tasks))
+
+        # Each (circuit, compilation path) pair is compiled as a separate task, longest first, so that one large
+        # circuit does not keep a single worker busy for all of its compilation paths. Threads suffice since each
+        # compilation itself runs in a timeout worker process.
+        Parallel(n_jobs=-1, verbose=100, batch_size=1, prefer="threads")(
+            delayed(self.compile_circuit_for_comp_path)(
+                filename,
+                comp_path_id,
+                source_path,
+                target_path,
+                timeout,
+                manifest=manifest,
+                source_hash=source_hashes[filename],
+            )
+            for filename, comp_path_id in tasks
         )
+        manifest.close()
 
     def generate_trainingdata_from_qasm_files(
         self,
         source_path: str = None,
         target_path: str = None,
+        filenames: list = None,
     ):
         """Handles to create training data from all generated training samples
 
         Keyword arguments:
         source_path -- path to file
         target_directory -- path to directory for compiled circuit
+        filenames -- filenames of the training samples within source_path, all qasm files if not provided
 
         Return values:
         training_data -- training data
@@ -223,12 +356,36 @@ class Predictor:
         name_list = []
         scores_list = []
 
-        results = Parallel(n_jobs=-1, verbose=100)(
-            delayed(self.generate_training_sample)(
-                str(filename), source_path, target_path
+        if filenames is None:
+            filenames = [
+                filename.name
+                for filename in Path(source_path).iterdir()
+                if ".qasm" in filename.name
+            ]
+        # Created for all circuits before the scoring, so that the feature and scoring worker processes do not
+        # compete for the cores
+        feature_dicts = list(
+            utils.create_feature_dicts(
+                str(Path(source_path) / filename) for filename in filenames
             )
-            for filename in Path(source_path).iterdir()
         )
+        # A single scan of the compiled circuits instead of one per training sample
+        compiled_circuit_index = utils.get_compiled_circuit_index(target_path)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # The workers load the calibrations from this snapshot instead of building them again
+            calibration_snapshot = str(Path(tmp_dir) / "calibration_snapshot.npz")
+            utils.save_calibration_snapshot(calibration_snapshot)
+            results = Parallel(n_jobs=-1, verbose=100)(
+                delayed(self.generate_training_sample)(
+                    filename,
+                    source_path,
+                    target_path,
+                    feature_dict,
+                    calibration_snapshot,
+                    compiled_circuit_index.get(Path(filename).stem, []),
+                )
+                for filename, feature_dict in zip(filenames, feature_dicts)
+            )
         for sample in results:
             if not sample:
                 continue
@@ -245,6 +402,9 @@ class Predictor:
         file: str,
         source_path: str = None,
         target_path: str = None,
+        feature_dict: dict = None,
+        calibration_snapshot: str = None,
+        compiled_circuits: list = None,
     ):
         """Handles to create training data from a single generated training sample
 
@@ -252,6 +412,10 @@ class Predictor:
         file -- filename for the training sample
         source_path -- path to file
         target_path -- path to directory for compiled circuit
+        feature_dict -- already created feature dictionary of the training sample, created if not provided
+        calibration_snapshot -- path to a calibration snapshot to load the device calibrations from
+        compiled_circuits -- list of (comp_path_index, path) of all compiled circuits of the training sample, determined
+        from target_path if not provided
 
         Return values:
         training_sample -- training data sample
@@ -271,21 +435,22 @@ class Predictor:
             return False
 
         LUT = utils.get_index_to_comppath_LUT()
-        utils.init_all_config_files()
+        utils.get_device_calibrations(calibration_snapshot)
         print("Checking ", file)
         scores = []
         for _ in range(len(LUT)):
             scores.append([])
-        all_relevant_paths = Path(target_path) / (file.split(".")[0] + "*")
-        all_relevant_files = glob.glob(str(all_relevant_paths))
+        circuit_name = Path(file).stem
+        if compiled_circuits is None:
+            compiled_circuits = utils.get_compiled_circuit_index(target_path).get(
+                circuit_name, []
+            )
 
-        for filename in all_relevant_files:
-            if (file.split(".")[0] + "_") in filename and filename.endswith(".qasm"):
-                comp_path_index = int(filename.split("_")[-1].split(".")[0])
-                device = LUT.get(comp_path_index)[1]
+        for comp_path_index, filename in compiled_circuits:
+            device = LUT.get(comp_path_index)[1]
 
-                score = utils.calc_eval_score_for_qc(filename, device)
-                scores[comp_path_index] = score
+            score = utils.calc_eval_score_for_qc(filename, device)
+            scores[comp_path_index] = score
 
         num_not_empty_entries = 0
         for i in range(len(LUT)):
@@ -297,13 +462,255 @@ class Predictor:
         if num_not_empty_entries == 0:
             return False
 
-        feature_vec = utils.create_feature_dict(str(Path(source_path) / file))
-        training_sample = (list(feature_vec.values()), np.argmax(scores))
-        circuit_name = file.split(".")[0]
+        if feature_dict is None:
+            feature_dict = utils.create_feature_dict(str(Path(source_path) / file))
+        if not feature_dict:
+            return False
+        training_sample = (list(feature_dict.values()), np.argmax(scores))
 
         return (training_sample, circuit_name, scores)
 
-    def train_random_forest_classifier(self, visualize_results=False):
+    def add_new_training_samples(
+        self,
+        source_path: str = None,
+        target_path: str = None,
+        training_data_path: str = None,
+    ):
+        """Appends the training samples of all circuits in source_path that are not part of the stored training data
+        yet to it.
+
+        Keyword arguments:
+        source_path -- path to file
+        target_path -- path to directory for compiled circuit
+        training_data_path -- path to the training data store, the one within the package if not provided
+
+        Return values:
+        num_new_samples -- number of appended training samples
+        """
+        if source_path is None:
+            source_path = str(
+                resources.files("mqt.predictor").joinpath("training_samples")
+            )
+
+        training_data = utils.load_training_data(training_data_path)
+        known_names = (
+            set() if training_data is None else set(training_data.names.astype(str))
+        )
+        filenames = [
+            file.name
+            for file in Path(source_path).iterdir()
+            if ".qasm" in file.name and Path(file.name).stem not in known_names
+        ]
+        if not filenames:
+            return 0
+
+        res = self.generate_trainingdata_from_qasm_files(
+            source_path, target_path, filenames
+        )
+        if not res or not res[0]:
+            return 0
+        if training_data is None:
+            utils.save_training_data(res, training_data_path)
+        else:
+            utils.append_training_data(res, training_data_path)
+        return len(res[0])
+
+    def update_gate_array_store(self, target_path: str = None):
+        """Adds all compiled circuits in target_path that are new or have changed to the gate array store in the
+        "gate_arrays" subdirectory of target_path, which is the input of rescore_training_data.
+
+        Keyword arguments:
+        target_path -- path to directory for compiled circuit
+
+        Return values:
+        num_added -- number of added compiled circuits
+        """
+        if target_path is None:
+            target_path = str(
+                resources.files("mqt.predictor").joinpath("training_samples_compiled")
+            )
+
+        store = cache.GateArrayStore(Path(target_path) / "gate_arrays")
+        stored_file_hashes = store.get_file_hashes()
+        tasks = []
+        for name, compiled_circuits in utils.get_compiled_circuit_index(
+            target_path
+        ).items():
+            for comp_path_index, path in compiled_circuits:
+                file_hash = cache.get_file_hash(path)
+                if stored_file_hashes.get((name, comp_path_index)) != file_hash:
+                    tasks.append((name, comp_path_index, file_hash, path))
+
+        num_added = 0
+        # Appending in chunks bounds the memory and keeps the work done if the stage is interrupted
+        chunk_size = 1000
+        for i in range(0, len(tasks), chunk_size):
+            chunk = tasks[i : i + chunk_size]
+            results = Parallel(n_jobs=-1, verbose=100)(
+                delayed(utils.load_gate_arrays)(path) for _, _, _, path in chunk
+            )
+            entries = [
+                (name, comp_path_index, file_hash, gate_arrays)
+                for (name, comp_path_index, file_hash, _), gate_arrays in zip(
+                    chunk, results
+                )
+                if gate_arrays is not None
+            ]
+            store.append(entries)
+            num_added += len(entries)
+
+        return num_added
+
+    def rescore_training_data(
+        self,
+        target_path: str = None,
+        training_data_path: str = None,
+        devices: list = None,
+    ):
+        """Determines the scores of the stored training data again for the device calibrations in use (see
+        utils.get_device_calibrations). The compiled circuits are only taken from the gate array store, which has to
+        be updated beforehand by update_gate_array_store if compiled circuits were added or changed, and are evaluated
+        in one vectorized pass per device without reading any qasm file. Scores without a stored compiled circuit are
+        kept and the calibrations of devices without any are not recorded as up to date. An empty store is filled
+        first.
+
+        Keyword arguments:
+        target_path -- path to directory for compiled circuit
+        training_data_path -- path to the training data store, the one within the package if not provided
+        devices -- devices to be rescored, all devices whose calibration changed since the scores were determined
+        if not provided
+
+        Return values:
+        num_rescored_samples -- number of training samples whose scores were determined again
+        """
+        if target_path is None:
+            target_path = str(
+                resources.files("mqt.predictor").joinpath("training_samples_compiled")
+            )
+
+        training_data = utils.load_training_data(training_data_path)
+        if training_data is None:
+            return 0
+
+        if devices is None:
+            recorded_versions = utils.load_training_data_meta(training_data_path).get(
+                "calibration_versions", {}
+            )
+            devices = [
+                device
+                for device, version in utils.get_calibration_versions().items()
+                if recorded_versions.get(device) != version
+            ]
+        if not devices:
+            return 0
+        print("Rescoring for: ", devices)
+
+        store = cache.GateArrayStore(Path(target_path) / "gate_arrays")
+        if store.get_meta()["num_circuits"] == 0:
+            print("Gate array store is empty, it is filled first.")
+            self.update_gate_array_store(target_path)
+        columns = store.load()
+
+        rows = {name: row for row, name in enumerate(training_data.names.astype(str))}
+        scores = np.array(training_data.scores)
+        rescored_rows = set()
+        rescored_devices = []
+        calibrations = utils.get_device_calibrations()
+        LUT = utils.get_index_to_comppath_LUT()
+        for device in devices:
+            entries = [
+                (rows[name], comp_path_index, entry)
+                for (name, comp_path_index), entry in columns["latest"].items()
+                if name in rows and LUT[comp_path_index][1] == device
+            ]
+            if not entries:
+                print("No compiled circuits stored for ", device)
+                continue
+            entry_rows, comp_path_indices, entry_indices = (
+                np.array(column) for column in zip(*entries)
+            )
+            device_scores = calibrations[device].calc_scores(
+                *store.get_gate_arrays(columns, entry_indices)
+            )
+            # Circuits that cannot be evaluated for the device are penalized
+            device_scores[~(device_scores > 0)] = utils.get_width_penalty()
+            scores[entry_rows, comp_path_indices] = device_scores
+            rescored_rows.update(entry_rows.tolist())
+            rescored_devices.append(device)
+
+        del training_data
+        if rescored_devices:
+            # Only the calibrations of the rescored devices are recorded, the others stay outdated
+            utils.update_training_data_scores(
+                scores, training_data_path, rescored_devices
+            )
+        return len(rescored_rows)
+
+    def retrain_random_forest_classifier(
+        self, n_additional_estimators: int = 100, training_data_path: str = None
+    ):
+        """Trains additional trees of the saved Random Forest classifier on all stored training data (warm start)
+        instead of training it from scratch and saves it. The feature schema of the classifier is kept. If the
+        labels comprise other compilation paths than the classifier knows, it is trained from scratch with the same
+        hyperparameters instead.
+
+        Keyword arguments:
+        n_additional_estimators -- number of additionally trained trees
+        training_data_path -- path to the training data store, the one within the package if not provided
+
+        Return values:
+        True -- classifier is trained
+        False -- if not
+        """
+        if not self.load_classifier():
+            return False
+
+        training_data = utils.load_training_data(training_data_path)
+        if training_data is None:
+            return False
+        X = self.feature_schema.apply(training_data.features)
+        y = np.asarray(training_data.labels)
+
+        clf = self.clf
+        if np.array_equal(np.unique(y), clf.classes_):
+            clf.set_params(
+                warm_start=True,
+                n_estimators=clf.n_estimators + n_additional_estimators,
+            )
+            clf.fit(X, y)
+            clf.set_params(warm_start=False)
+        else:
+            print("Compilation paths of the labels changed, training from scratch.")
+            clf = clone(clf).fit(X, y)
+
+        self.set_classifier(clf)
+        utils.save_classifier(clf, self.feature_schema)
+        print("Random Forest classifier is retrained and saved.")
+
+        return True
+
+    def train_random_forest_classifier(
+        self,
+        visualize_results=False,
+        search_mode: str = "halving",
+        time_budget: float = None,
+        n_jobs: int = -1,
+        search_results_path: str = "results/hyperparameter_search.json",
+    ):
+        """Trains the Random Forest classifier with the best found hyperparameters and saves it.
+
+        Keyword arguments:
+        visualize_results -- whether the results on the test data are plotted
+        search_mode -- "halving" (successive halving over the hyperparameter grid), "random" (random order of the
+        hyperparameter grid until the time budget is exhausted) or "grid" (exhaustive grid search)
+        time_budget -- time budget in seconds for the "random" search mode, the whole grid is searched if not provided
+        n_jobs -- number of parallel jobs, all available cores are used for -1
+        search_results_path -- path of the JSON file the results of the hyperparameter search are saved to
+
+        Return values:
+        True -- classifier is trained
+        False -- if not
+        """
 
         (
             X_train,
@@ -314,24 +721,22 @@ class Predictor:
             indices_test,
             names_list,
             scores_list,
-        ) = self.get_prepared_training_data(save_non_zero_indices=True)
+        ) = self.get_prepared_training_data()
 
         scores_filtered = [scores_list[i] for i in indices_test]
         names_filtered = [names_list[i] for i in indices_test]
 
-        tree_param = [
-            {
-                "n_estimators": [100, 200, 500],
-                "max_features": ["auto", "sqrt"],
-                "max_depth": list(range(8, 30, 6)),
-                "min_samples_split": list(range(2, 20, 6)),
-                "min_samples_leaf": list(range(2, 20, 6)),
-                "bootstrap": [True, False],
-            },
-        ]
+        res = self.search_hyperparameters(
+            X_train, y_train, search_mode, time_budget, n_jobs
+        )
+        if res is None:
+            return False
+        clf, search_results = res
 
-        clf = RandomForestClassifier(random_state=0)
-        clf = GridSearchCV(clf, tree_param, cv=5, n_jobs=8).fit(X_train, y_train)
+        search_results_path = Path(search_results_path)
+        search_results_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(search_results_path, "w") as f:
+            json.dump(search_results, f, indent=2)
 
         if visualize_results:
             y_pred = np.array(list(clf.predict(X_test)))
@@ -339,42 +744,177 @@ class Predictor:
                 scores_filtered, y_pred, y_test, filename="RandomForestClassifier"
             )
 
-            print("Best Accuracy: ", clf.best_score_)
+            print("Best Accuracy: ", search_results["best_score"])
             top3 = (res.count(1) + res.count(2) + res.count(3)) / len(res)
             print("Top 3: ", top3)
-            print("Feature Importance: ", clf.best_estimator_.feature_importances_)
+            print("Feature Importance: ", clf.feature_importances_)
 
             self.plot_eval_all_detailed_compact_normed(
                 names_filtered, scores_filtered, y_pred, y_test
             )
 
-        self.set_classifier(clf.best_estimator_)
-        utils.save_classifier(clf.best_estimator_)
+        self.set_classifier(clf)
+        utils.save_classifier(clf, self.feature_schema)
         print("Random Forest classifier is trained and saved.")
 
         return self.clf is not None
 
-    def get_prepared_training_data(self, save_non_zero_indices=False):
-        training_data, names_list, scores_list = utils.load_training_data()
-        X, y = zip(*training_data)
-        X = list(X)
-        y = list(y)
-        for i in range(len(X)):
-            X[i] = list(X[i])
-            scores_list[i] = list(scores_list[i])
+    def get_random_forest_param_grid(self):
+        """Returns the hyperparameter grid of the Random Forest classifier."""
+        tree_param = {
+            "n_estimators": [100, 200, 500],
+            "max_features": ["auto", "sqrt"],
+            "max_depth": list(range(8, 30, 6)),
+            "min_samples_split": list(range(2, 20, 6)),
+            "min_samples_leaf": list(range(2, 20, 6)),
+            "bootstrap": [True, False],
+        }
+        return tree_param
+
+    def search_hyperparameters(
+        self,
+        X_train: np.ndarray,
+        y_train: np.ndarray,
+        search_mode: str = "halving",
+        time_budget: float = None,
+        n_jobs: int = -1,
+    ):
+        """Searches the best hyperparameters of the Random Forest classifier using 5-fold cross validation.
+
+        Keyword arguments:
+        X_train -- training features
+        y_train -- training labels
+        search_mode -- "halving", "random" or "grid", see train_random_forest_classifier
+        time_budget -- time budget in seconds for the "random" search mode
+        n_jobs -- number of parallel jobs, all available cores are used for -1
+
+        Return values:
+        clf -- Random Forest classifier with the best hyperparameters fitted on all training data
+        search_results -- dictionary of the best hyperparameters, their score and the results of all candidates
+        None -- if the search mode is unknown
+        """
+        tree_param = self.get_random_forest_param_grid()
+        clf = RandomForestClassifier(random_state=0)
+        start_time = time.perf_counter()
 
-        X, y, indices = np.array(X), np.array(y), np.array(range(len(y)))
+        if search_mode == "grid":
+            search = GridSearchCV(clf, tree_param, cv=5, n_jobs=n_jobs)
+        elif search_mode == "halving":
+            search = HalvingGridSearchCV(
+                clf, tree_param, cv=5, factor=3, n_jobs=n_jobs, random_state=0
+            )
+        elif search_mode == "random":
+            return self.search_hyperparameters_with_time_budget(
+                clf, tree_param, X_train, y_train, time_budget, n_jobs
+            )
+        else:
+            print("Error: Search mode not found.")
+            return None
 
-        # Store all non zero feature indices
-        non_zero_indices = []
-        for i in range(len(X[0])):
-            if sum(X[:, i]) > 0:
-                non_zero_indices.append(i)
-        X = X[:, non_zero_indices]
+        search.fit(X_train, y_train)
+        search_results = self.get_search_results(
+            search_mode,
+            [search.cv_results_],
+            search.best_params_,
+            search.best_score_,
+            time.perf_counter() - start_time,
+        )
+        return search.best_estimator_, search_results
 
-        if save_non_zero_indices:
-            data = np.asarray(non_zero_indices)
-            np.save("non_zero_indices.npy", data)
+    def search_hyperparameters_with_time_budget(
+        self,
+        clf: RandomForestClassifier,
+        tree_param: dict,
+        X_train: np.ndarray,
+        y_train: np.ndarray,
+        time_budget: float = None,
+        n_jobs: int = -1,
+    ):
+        """Evaluates the candidates of the hyperparameter grid in random order, one batch of as many candidates as
+        parallel jobs after the other, until all are evaluated or the time budget is exhausted. The budget is checked
+        between batches, so the search may exceed it by the duration of one batch."""
+        start_time = time.perf_counter()
+        candidates = list(
+            ParameterSampler(
+                tree_param, n_iter=len(ParameterGrid(tree_param)), random_state=0
+            )
+        )
+        batch_size = effective_n_jobs(n_jobs)
+
+        cv_results = []
+        best_params = None
+        best_score = -np.inf
+        for i in range(0, len(candidates), batch_size):
+            if (
+                time_budget is not None
+                and cv_results
+                and time.perf_counter() - start_time > time_budget
+            ):
+                break
+            batch = [
+                {key: [value] for key, value in candidate.items()}
+                for candidate in candidates[i : i + batch_size]
+            ]
+            search = GridSearchCV(clf, batch, cv=5, n_jobs=n_jobs, refit=False)
+            search.fit(X_train, y_train)
+            cv_results.append(search.cv_results_)
+            if search.best_score_ > best_score:
+                best_params = search.best_params_
+                best_score = search.best_score_
+
+        best_clf = clone(clf).set_params(**best_params).fit(X_train, y_train)
+        search_results = self.get_search_results(
+            "random",
+            cv_results,
+            best_params,
+            best_score,
+            time.perf_counter() - start_time,
+        )
+        return best_clf, search_results
+
+    def get_search_results(
+        self,
+        search_mode: str,
+        cv_results: list,
+        best_params: dict,
+        best_score: float,
+        duration: float,
+    ):
+        """Returns the results of a hyperparameter search as a JSON serializable dictionary."""
+        candidates = []
+        for results in cv_results:
+            for i, params in enumerate(results["params"]):
+                candidate = {
+                    "params": params,
+                    "mean_test_score": float(results["mean_test_score"][i]),
+                    "std_test_score": float(results["std_test_score"][i]),
+                    "mean_fit_time": float(results["mean_fit_time"][i]),
+                }
+                if "n_resources" in results:
+                    candidate["n_resources"] = int(results["n_resources"][i])
+                candidates.append(candidate)
+
+        return {
+            "search_mode": search_mode,
+            "duration": duration,
+            "best_params": best_params,
+            "best_score": float(best_score),
+            "candidates": candidates,
+        }
+
+    def get_prepared_training_data(self):
+        """Returns the training data split into training and test data, restricted to the features that are
+        non-zero for at least one training sample. The according feature schema is set as the feature schema of
+        the predictor, since a classifier trained on these features must be used together with it."""
+        training_data = utils.load_training_data()
+        X = training_data.features
+        y = np.asarray(training_data.labels)
+        indices = np.arange(len(y))
+        names_list = training_data.names.astype(str).tolist()
+        scores_list = training_data.scores.tolist()
+
+        self.feature_schema = utils.build_feature_schema(X)
+        X = self.feature_schema.apply(X)
 
         (
             X_train,
@@ -516,61 +1056,247 @@ class Predictor:
 
         return
 
-    def predict(self, qasm_str_or_path: str):
-        """Returns a compilation option prediction index for a given qasm file path or qasm string."""
+    def predict(self, qasm_str_or_path: str | QuantumCircuit | Circuit):
+        """Returns a compilation option prediction index for a given qasm file path, qasm string, QuantumCircuit or
+        pytket Circuit."""
 
-        if self.clf is None:
-            path = resources.files("mqt.predictor") / "trained_clf.joblib"
-            if path.is_file():
-                self.clf = load(str(path))
-            else:
-                print("Fail: Classifier is neither trained nor saved!")
-                return None
+        res = self.predict_batch([qasm_str_or_path])
+        if res is None:
+            return None
 
-        feature_dict = utils.create_feature_dict(qasm_str_or_path)
-        if not feature_dict:
+        predictions, failed = res
+        if failed[0] or predictions[0] < 0:
             return None
-        feature_vector = list(feature_dict.values())
+        return predictions[0]
 
-        path = resources.files("mqt.predictor") / "non_zero_indices.npy"
-        non_zero_indices = np.load(str(path), allow_pickle=True)
-        feature_vector = [feature_vector[i] for i in non_zero_indices]
+    def predict_batch(self, qasm_str_or_paths, n_jobs: int = 1):
+        """Returns compilation option prediction indices for several qasm file paths, qasm strings, QuantumCircuits
+        or pytket Circuits at once.
+        The classifier is called only once for the whole batch.
+
+        Keyword arguments:
+        qasm_str_or_paths -- iterable of qasm file paths, qasm strings, QuantumCircuits or pytket Circuits
+        n_jobs -- number of processes used to create the features, -1 uses all available cores
 
-        return self.clf.predict([feature_vector])[0]
+        Return values:
+        predictions -- array of prediction indices, -1 for circuits whose features could not be created or that are
+        too large for all devices
+        failed -- boolean array marking the circuits whose features could not be created
+        """
+        if not self.load_classifier():
+            return None
+
+        feature_matrix, failed = self.create_feature_matrix(qasm_str_or_paths, n_jobs)
+        predictions = np.full(len(failed), -1, dtype=int)
+        if len(feature_matrix):
+            predictions[~failed] = self.predict_feature_matrix(feature_matrix)
+
+        return predictions, failed
+
+    def predict_ranked(
+        self, qasm_str_or_path: str | QuantumCircuit | Circuit, k: int = 3
+    ):
+        """Returns the k most probable compilation option prediction indices for a given qasm file path, qasm string,
+        QuantumCircuit or pytket Circuit, e.g., to fall back to the next one if the compilation of the first one fails.
+
+        Return values:
+        predictions -- array of the k prediction indices ordered by decreasing probability, -1 for missing ones
+        probabilities -- array of their probabilities
+        """
+        res = self.predict_ranked_batch([qasm_str_or_path], k)
+        if res is None:
+            return None
+
+        predictions, probabilities, failed = res
+        if failed[0] or predictions[0, 0] < 0:
+            return None
+        return predictions[0], probabilities[0]
+
+    def predict_ranked_batch(self, qasm_str_or_paths, k: int = 3, n_jobs: int = 1):
+        """Returns the k most probable compilation option prediction indices for several qasm file paths, qasm
+        strings, QuantumCircuits or pytket Circuits at once.
+        The classifier is called only once for the whole batch.
+
+        Keyword arguments:
+        qasm_str_or_paths -- iterable of qasm file paths, qasm strings, QuantumCircuits or pytket Circuits
+        k -- number of predictions per circuit
+        n_jobs -- number of processes used to create the features, -1 uses all available cores
+
+        Return values:
+        predictions -- matrix of the k prediction indices per circuit ordered by decreasing probability, -1 for
+        missing ones, i.e., if there are less than k feasible compilation paths or the features could not be created
+        probabilities -- matrix of their probabilities
+        failed -- boolean array marking the circuits whose features could not be created
+        """
+        if k < 1:
+            raise ValueError("k must be at least 1.")
+        if not self.load_classifier():
+            return None
+
+        feature_matrix, failed = self.create_feature_matrix(qasm_str_or_paths, n_jobs)
+        predictions = np.full((len(failed), k), -1, dtype=int)
+        probabilities = np.zeros((len(failed), k))
+        if len(feature_matrix):
+            (
+                predictions[~failed],
+                probabilities[~failed],
+            ) = self.rank_feature_matrix(feature_matrix, k)
+
+        return predictions, probabilities, failed
+
+    def create_feature_matrix(self, qasm_str_or_paths, n_jobs: int = 1):
+        """Returns the matrix of complete feature vectors of all circuits whose features could be created together
+        with a boolean array marking the circuits whose features could not be created."""
+        feature_vectors = []
+        failed = []
+        for feature_dict in utils.create_feature_dicts(
+            qasm_str_or_paths, n_jobs, feature_cache=self.feature_cache
+        ):
+            failed.append(not feature_dict)
+            if feature_dict:
+                feature_vectors.append(list(feature_dict.values()))
+
+        return np.array(feature_vectors), np.array(failed, dtype=bool)
+
+    def predict_feature_matrix(self, feature_matrix: np.ndarray):
+        """Returns the compilation option prediction indices for a matrix of complete feature vectors (one row per
+        circuit) in a single classifier call. The classifier must already be loaded.
+        Only compilation paths whose device has enough qubits for the circuit are predicted, i.e., the feasible one
+        with the highest probability. Circuits that are too large for all devices are predicted as -1."""
+        predictions, _probabilities = self.rank_feature_matrix(feature_matrix, 1)
+        return predictions[:, 0]
+
+    def rank_feature_matrix(self, feature_matrix: np.ndarray, k: int):
+        """Returns the k most probable feasible compilation option prediction indices (see predict_feature_matrix)
+        and their probabilities for a matrix of complete feature vectors in a single classifier call. Missing
+        predictions are marked as -1 with probability 0."""
+        probabilities = self.clf.predict_proba(
+            self.feature_schema.apply(feature_matrix)
+        )
+        feasible = self.get_feasibility_mask(feature_matrix)
+        # Infeasible compilation paths are ranked last, ties are kept in the order of the classes
+        ranking = np.argsort(
+            -np.where(feasible, probabilities, -1), axis=1, kind="stable"
+        )[:, :k]
+        ranked_feasible = np.take_along_axis(feasible, ranking, axis=1)
+
+        predictions = np.full((len(feature_matrix), k), -1, dtype=int)
+        ranked_probabilities = np.zeros((len(feature_matrix), k))
+        num_ranked = ranking.shape[1]
+        predictions[:, :num_ranked] = np.where(
+            ranked_feasible, self.clf.classes_[ranking], -1
+        )
+        ranked_probabilities[:, :num_ranked] = np.where(
+            ranked_feasible, np.take_along_axis(probabilities, ranking, axis=1), 0
+        )
+        return predictions, ranked_probabilities
+
+    def get_feasibility_mask(self, feature_matrix: np.ndarray):
+        """Returns a boolean matrix marking for each circuit (rows) and each class of the classifier (columns) if the
+        device of the compilation path has enough qubits for the circuit."""
+        num_qubits = feature_matrix[:, utils.get_feature_names().index("num_qubits")]
+        max_qubits = utils.get_comp_path_max_qubits()[self.clf.classes_]
+        return num_qubits[:, np.newaxis] <= max_qubits[np.newaxis, :]
+
+    def predict_and_compile(self, qasm_str_or_path: str | QuantumCircuit | Circuit):
+        """Returns a compilation option prediction index for a given qasm file path, qasm string, QuantumCircuit or
+        pytket Circuit together with the accordingly compiled quantum circuit. The circuit is parsed at most once for
+        both steps.
+
+        Return values:
+        prediction -- compilation option prediction index
+        compiled_qasm -- compiled quantum circuit as a qasm string
+        """
+        if not self.load_classifier():
+            return None
+
+        circuit_hash = self.get_circuit_hash(qasm_str_or_path)
+
+        qc = None
+        feature_dict = None
+        if self.feature_cache is not None:
+            feature_dict = self.feature_cache.get(circuit_hash)
+        if feature_dict is None:
+            qc = utils.load_quantum_circuit(qasm_str_or_path)
+            if qc is None:
+                return None
+            feature_dict = utils.create_feature_dict_for_qc(qc)
+            if self.feature_cache is not None:
+                self.feature_cache.put(circuit_hash, feature_dict)
+
+        prediction = self.predict_feature_matrix(
+            np.array([list(feature_dict.values())])
+        )[0]
+        if prediction < 0:
+            print("Circuit is too large for all devices.")
+            return None
+
+        if self.compiled_circuit_store is not None and circuit_hash is not None:
+            compiled_qasm = self.compiled_circuit_store.get(circuit_hash, prediction)
+            if compiled_qasm is not None:
+                return prediction, compiled_qasm
+
+        if qc is None:
+            qc = utils.load_quantum_circuit(qasm_str_or_path)
+            if qc is None:
+                return None
+        compiled_qasm = self.compile_quantum_circuit(qc, prediction)
+        if compiled_qasm and self.compiled_circuit_store is not None and circuit_hash:
+            self.compiled_circuit_store.put(circuit_hash, prediction, compiled_qasm)
+
+        return prediction, compiled_qasm
+
+    def get_circuit_hash(self, qasm_str_or_path: str):
+        """Returns the hash of a given qasm file path or qasm string if any cache is used and None otherwise."""
+        if self.feature_cache is None and self.compiled_circuit_store is None:
+            return None
+
+        qasm_str = utils.read_qasm_str(qasm_str_or_path)
+        if qasm_str is None:
+            return None
+        return cache.get_qasm_hash(qasm_str)
 
     def compile_predicted_compilation_path(
-        self, qasm_str_or_path: str, prediction: int
+        self, qasm_str_or_path: str | QuantumCircuit | Circuit, prediction: int
     ):
-        """Returns the compiled quantum circuit as a qasm string when the original qasm circuit is provided as either
-        a string or a file path and the prediction index is given."""
+        """Returns the compiled quantum circuit as a qasm string when the original circuit is provided as either a
+        qasm string, a qasm file path, a QuantumCircuit or a pytket Circuit and the prediction index is given."""
 
         LUT = utils.get_index_to_comppath_LUT()
         if prediction < 0 or prediction >= len(LUT):
             print("Provided prediction is faulty.")
             return None
 
-        if Path(qasm_str_or_path).exists():
-            print("Reading from .qasm path: ", qasm_str_or_path)
-            qc = QuantumCircuit.from_qasm_file(qasm_str_or_path)
-        elif QuantumCircuit.from_qasm_str(qasm_str_or_path):
-            print("Reading from .qasm str")
-            qc = QuantumCircuit.from_qasm_str(qasm_str_or_path)
-        else:
-            print("Neither a qasm file path nor a qasm str has been provided.")
+        circuit_hash = self.get_circuit_hash(qasm_str_or_path)
+        if self.compiled_circuit_store is not None and circuit_hash is not None:
+            compiled_qasm = self.compiled_circuit_store.get(circuit_hash, prediction)
+            if compiled_qasm is not None:
+                return compiled_qasm
+
+        qc = utils.load_quantum_circuit(qasm_str_or_path)
+        if qc is None:
             return False
 
-        prediction_information = LUT.get(prediction)
+        compiled_qasm = self.compile_quantum_circuit(qc, prediction)
+        if compiled_qasm and self.compiled_circuit_store is not None and circuit_hash:
+            self.compiled_circuit_store.put(circuit_hash, prediction, compiled_qasm)
+        return compiled_qasm
+
+    @staticmethod
+    def compile_quantum_circuit(qc: QuantumCircuit, prediction: int):
+        """Returns the compiled quantum circuit as a qasm string for an already parsed quantum circuit and a valid
+        prediction index."""
+        prediction_information = utils.get_index_to_comppath_LUT().get(prediction)
         gate_set_name = prediction_information[0]
         device = prediction_information[1]
         compiler = prediction_information[2]
         compiler_settings = prediction_information[3]
 
-        print("")
         if compiler == "qiskit":
             compiled_qc = qiskit_helper.get_mapped_level(
                 qc, gate_set_name, qc.num_qubits, device, compiler_settings, False, True
             )
-            return compiled_qc.qasm()
+            compiled_qasm = compiled_qc.qasm()
         elif compiler == "tket":
             compiled_qc = tket_helper.get_mapped_level(
                 qc,
@@ -581,10 +1307,117 @@ class Predictor:
                 False,
                 True,
             )
-            return circuit_to_qasm_str(compiled_qc)
+            compiled_qasm = circuit_to_qasm_str(compiled_qc)
         else:
             print("Error: Compiler not found.")
             return False
+        return utils.postprocess_qasm_str(compiled_qasm, prediction)
+
+    def compile_best_of_k(
+        self,
+        qasm_str_or_path: str | QuantumCircuit | Circuit,
+        k: int = 3,
+        deadline: float = 60,
+    ):
+        """Compiles a given qasm file path, qasm string, QuantumCircuit or pytket Circuit for its k most probable
+        compilation paths (see predict_ranked) concurrently in worker processes and returns the compiled circuit with
+        the highest evaluation score among the ones finished within the deadline. Compilations still running at the
+        deadline are aborted, so that a compiler hanging on the circuit does not delay the result.
+
+        Keyword arguments:
+        qasm_str_or_path -- qasm file path, qasm string, QuantumCircuit or pytket Circuit
+        k -- number of compilation paths compiled
+        deadline -- wall-clock time limit in seconds for all compilations
+
+        Return values:
+        prediction -- prediction index of the best compiled circuit
+        compiled_qasm -- best compiled circuit as a qasm string
+        score -- its evaluation score
+        """
+        start_time = time.perf_counter()
+        if not self.load_classifier():
+            return None
+
+        qc = utils.load_quantum_circuit(qasm_str_or_path)
+        if qc is None:
+            return None
+        feature_matrix = np.array([list(utils.create_feature_dict_for_qc(qc).values())])
+        predictions, _probabilities = self.rank_feature_matrix(feature_matrix, k)
+        candidates = [
+            int(prediction) for prediction in predictions[0] if prediction >= 0
+        ]
+        if not candidates:
+            print("Circuit is too large for all devices.")
+            return None
+
+        executor = utils.TimeoutExecutor(len(candidates))
+        try:
+            remaining_time = max(deadline - (time.perf_counter() - start_time), 0)
+            futures = [
+                executor.submit(compile_and_evaluate, [qc, prediction], remaining_time)
+                for prediction in candidates
+            ]
+            results = [future.result() for future in futures]
+        finally:
+            executor.shutdown(kill=True)
+
+        best = None
+        circuit_hash = self.get_circuit_hash(qasm_str_or_path)
+        for prediction, result in zip(candidates, results):
+            if not result.succeeded or not result.value:
+                print(
+                    "Compilation failed for ", prediction, result.status, result.error
+                )
+                continue
+            compiled_qasm, score = result.value
+            if self.compiled_circuit_store is not None and circuit_hash:
+                self.compiled_circuit_store.put(circuit_hash, prediction, compiled_qasm)
+            if best is None or score > best[2]:
+                best = (prediction, compiled_qasm, score)
+
+        if best is None:
+            print("No compilation succeeded within the deadline.")
+        return best
+
+
+def compile_to_qasm_file(
+    qc: str | QuantumCircuit,
+    comp_path_id: int,
+    target_path: str,
+    target_filename: str,
+):
+    """Compiles a quantum circuit, given as qasm file path or already parsed, for a compilation path and saves it,
+    postprocessed in memory (see utils.postprocess_qasm_str), as target_filename.qasm in target_path. The file is
+    written once to a temporary file that replaces the target atomically. Used by compile_circuit_for_comp_path
+    within timeout worker processes.
+
+    Return values:
+    True -- compilation succeeded
+    False -- if not
+    """
+    if not isinstance(qc, QuantumCircuit):
+        qc = QuantumCircuit.from_qasm_file(qc)
+    compiled_qasm = Predictor.compile_quantum_circuit(qc, comp_path_id)
+    if not compiled_qasm:
+        return False
+    target = Path(target_path) / (target_filename + ".qasm")
+    tmp_target = target.with_name(target.name + ".tmp")
+    tmp_target.write_text(compiled_qasm)
+    os.replace(tmp_target, target)
+    return True
+
+
+def compile_and_evaluate(qc: QuantumCircuit, prediction: int):
+    """Returns the compiled quantum circuit as a qasm string for a valid prediction index together with its
+    evaluation score and False if the compilation fails. Used by compile_best_of_k within worker processes."""
+    compiled_qasm = Predictor.compile_quantum_circuit(qc, prediction)
+    if not compiled_qasm:
+        return False
+    device = utils.get_index_to_comppath_LUT()[prediction][1]
+    score = utils.calc_eval_score_for_qc(
+        QuantumCircuit.from_qasm_str(compiled_qasm), device
+    )
+    return compiled_qasm, score
 
 
 if __name__ == "__main__":
@@ -592,20 +1425,42 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Create Training Data")
 
     parser.add_argument("--timeout", type=int, default=120)
+    parser.add_argument(
+        "--search-mode", choices=["halving", "random", "grid"], default="halving"
+    )
+    parser.add_argument("--time-budget", type=float, default=None)
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--rescore-only", action="store_true")
+    parser.add_argument("--calibration-snapshot", type=str, default=None)
 
     args = parser.parse_args()
 
+    # Use the calibration snapshot, if provided, for all evaluations of this run
+    utils.get_device_calibrations(args.calibration_snapshot)
     predictor = Predictor()
 
+    if args.rescore_only:
+        # Update the scores affected by changed calibrations from the stored gate arrays of the compiled circuits only
+        predictor.rescore_training_data()
+        sys.exit(0)
+
     # Generate compiled circuits and save them as qasm files
     predictor.generate_compiled_circuits(
         timeout=args.timeout,
     )
-    # Postprocess some of those qasm files
-    utils.postprocess_ocr_qasm_files()
-    # Generate training data from qasm files
-    res = predictor.generate_trainingdata_from_qasm_files()
-    # Save those training data for faster re-processing
-    utils.save_training_data(res)
-    # Train the Random Forest Classifier on created training data
-    predictor.train_random_forest_classifier()
+    if args.incremental:
+        # Update the scores affected by changed calibrations, add the training samples of new circuits and train
+        # additional trees of the saved classifier
+        predictor.update_gate_array_store()
+        predictor.rescore_training_data()
+        predictor.add_new_training_samples()
+        predictor.retrain_random_forest_classifier()
+    else:
+        # Generate training data from qasm files
+        res = predictor.generate_trainingdata_from_qasm_files()
+        # Save those training data for faster re-processing
+        utils.save_training_data(res)
+        # Train the Random Forest Classifier on created training data
+        predictor.train_random_forest_classifier(
+            search_mode=args.search_mode, time_budget=args.time_budget
+        )
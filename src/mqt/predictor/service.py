@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from mqt.predictor.driver import Predictor
+
+
+class AsyncPredictor:
+    """Asyncio front end of a Predictor that coalesces concurrent prediction requests into micro-batches.
+
+    Requests are queued and a batch is formed as soon as max_batch_size requests are queued or max_wait seconds
+    passed since the first request of the batch arrived. Each batch is predicted by a single call of
+    Predictor.predict_ranked_batch in an executor thread, i.e., the features of all its circuits are created and the
+    classifier is called once for the whole batch, while the event loop keeps accepting requests.
+    """
+
+    def __init__(
+        self,
+        predictor: Predictor = None,
+        max_batch_size: int = 64,
+        max_wait: float = 0.01,
+        n_jobs: int = 1,
+    ):
+        """Keyword arguments:
+        predictor -- Predictor used for the predictions, a new one with the classifier of the package if not provided
+        max_batch_size -- maximal number of requests per batch
+        max_wait -- maximal time in seconds the first request of a batch waits for further requests
+        n_jobs -- number of processes used to create the features of a batch, -1 uses all available cores
+        """
+        self.predictor = Predictor() if predictor is None else predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.n_jobs = n_jobs
+        # A single thread, since the batches are predicted one after another anyway
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.queue = None
+        self.batch_task = None
+        # Only the sizes of the most recent batches are kept, the totals are counted separately
+        self.batch_sizes = deque(maxlen=1000)
+        self.num_batches = 0
+        self.num_requests = 0
+
+    async def start(self):
+        """Loads the classifier and starts processing the queued requests. Returns False if the classifier cannot be
+        loaded."""
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(
+            self.executor, self.predictor.load_classifier
+        ):
+            return False
+        self.queue = asyncio.Queue()
+        self.batch_task = asyncio.create_task(self.process_batches())
+        return True
+
+    async def stop(self):
+        """Stops processing requests. Requests that are still queued or in the batch currently predicted are
+        cancelled."""
+        if self.batch_task is not None:
+            self.batch_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.batch_task
+            self.batch_task = None
+        while self.queue is not None and not self.queue.empty():
+            _qasm_str_or_path, _k, future = self.queue.get_nowait()
+            future.cancel()
+        # Waits for a still running batch prediction without blocking the event loop
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.executor.shutdown, True
+        )
+
+    async def __aenter__(self):
+        if not await self.start():
+            raise RuntimeError("Classifier could not be loaded.")
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
+
+    async def predict(self, qasm_str_or_path):
+        """Returns a compilation option prediction index for a given qasm file path or qasm string (see
+        Predictor.predict) once the batch of the request is predicted and None if it cannot be predicted."""
+        res = await self.predict_ranked(qasm_str_or_path, 1)
+        if res is None:
+            return None
+        predictions, _probabilities = res
+        return int(predictions[0])
+
+    async def predict_ranked(self, qasm_str_or_path, k: int = 3):
+        """Returns the k most probable compilation option prediction indices and their probabilities for a given
+        qasm file path or qasm string (see Predictor.predict_ranked) once the batch of the request is predicted and
+        None if it cannot be predicted."""
+        if self.batch_task is None:
+            raise RuntimeError("AsyncPredictor is not started.")
+        if k < 1:
+            # Also checked by Predictor.predict_ranked_batch, but rejected before queuing so that the other requests
+            # of the batch are not failed
+            raise ValueError("k must be at least 1.")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((qasm_str_or_path, k, future))
+        return await future
+
+    async def process_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self.queue.get()]
+            batch_deadline = loop.time() + self.max_wait
+            while len(requests) < self.max_batch_size:
+                if not self.queue.empty():
+                    requests.append(self.queue.get_nowait())
+                    continue
+                remaining_time = batch_deadline - loop.time()
+                if remaining_time <= 0:
+                    break
+                try:
+                    requests.append(
+                        await asyncio.wait_for(self.queue.get(), remaining_time)
+                    )
+                except asyncio.TimeoutError:
+                    break
+            await self.process_batch(requests)
+
+    async def process_batch(self, requests: list):
+        """Predicts a batch of (qasm_str_or_path, k, future) requests and resolves their futures."""
+        requests = [request for request in requests if not request[2].done()]
+        if not requests:
+            return
+        self.batch_sizes.append(len(requests))
+        self.num_batches += 1
+        self.num_requests += len(requests)
+        try:
+            k = max(request_k for _qasm_str_or_path, request_k, _future in requests)
+            (
+                predictions,
+                probabilities,
+                failed,
+            ) = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                self.predictor.predict_ranked_batch,
+                [qasm_str_or_path for qasm_str_or_path, _k, _future in requests],
+                k,
+                self.n_jobs,
+            )
+
+            for i, (_qasm_str_or_path, request_k, future) in enumerate(requests):
+                if future.done():
+                    continue
+                if failed[i] or predictions[i, 0] < 0:
+                    future.set_result(None)
+                else:
+                    future.set_result(
+                        (predictions[i, :request_k], probabilities[i, :request_k])
+                    )
+        except Exception as e:
+            # The error only fails the requests of this batch, later batches are still processed
+            for _qasm_str_or_path, _k, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # E.g., if the batch task is cancelled by stop() while the batch is predicted
+            for _qasm_str_or_path, _k, future in requests:
+                if not future.done():
+                    future.cancel()
+
+
+async def handle_http_connection(
+    async_predictor: AsyncPredictor,
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+):
+    """Serves the HTTP/1.1 requests of one connection. A POST request to /predict with a JSON body
+    {"qasm": qasm string, "k": number of predictions} is answered with {"predictions": [...], "probabilities": [...]},
+    where both lists are empty if the circuit cannot be predicted."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, _version = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            if method != "POST" or path != "/predict":
+                status, response = "404 Not Found", {
+                    "error": "Only POST /predict is supported."
+                }
+            else:
+                try:
+                    request = json.loads(body)
+                    res = await async_predictor.predict_ranked(
+                        request["qasm"], int(request.get("k", 1))
+                    )
+                    predictions, probabilities = ([], []) if res is None else res
+                    status, response = "200 OK", {
+                        "predictions": [
+                            int(prediction)
+                            for prediction in predictions
+                            if prediction >= 0
+                        ],
+                        "probabilities": [
+                            float(probability)
+                            for prediction, probability in zip(
+                                predictions, probabilities
+                            )
+                            if prediction >= 0
+                        ],
+                    }
+                except (ValueError, KeyError, TypeError) as e:
+                    status, response = "400 Bad Request", {"error": repr(e)}
+
+            response_body = json.dumps(response).encode()
+            keep_alive = headers.get("connection", "").lower() != "close"
+            writer.write(
+                (
+                    "HTTP/1.1 "
+                    + status
+                    + "\r\nContent-Type: application/json\r\nContent-Length: "
+                    + str(len(response_body))
+                    + "\r\nConnection: "
+                    + ("keep-alive" if keep_alive else "close")
+                    + "\r\n\r\n"
+                ).encode("latin-1")
+                + response_body
+            )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(
+    async_predictor: AsyncPredictor,
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    unix_socket_path: str = None,
+):
+    """Starts a minimal local HTTP server for an already started AsyncPredictor, e.g., for load testing. It listens
+    on the Unix socket if a path is provided and on host and port otherwise. Returns the asyncio server."""
+
+    async def handle_connection(reader, writer):
+        await handle_http_connection(async_predictor, reader, writer)
+
+    if unix_socket_path is not None:
+        return await asyncio.start_unix_server(handle_connection, path=unix_socket_path)
+    return await asyncio.start_server(handle_connection, host, port)
+
+
+async def serve(args):
+    async with AsyncPredictor(
+        max_batch_size=args.max_batch_size, max_wait=args.max_wait, n_jobs=args.n_jobs
+    ) as async_predictor:
+        server = await start_server(
+            async_predictor, args.host, args.port, args.unix_socket
+        )
+        print("Serving predictions on ", args.unix_socket or (args.host, args.port))
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Serve Predictions")
+
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix-socket", type=str, default=None)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait", type=float, default=0.01)
+    parser.add_argument("--n-jobs", type=int, default=1)
+
+    args = parser.parse_args()
+
+    asyncio.run(serve(args))
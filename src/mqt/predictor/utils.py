@@ -1,6 +1,20 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
 import json
-import signal
+import multiprocessing
+import os
+import queue
+import shutil
 import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property
+from types import MappingProxyType
 
 if sys.version_info < (3, 10, 0):
     import importlib_resources as resources
@@ -10,8 +24,11 @@ else:
 from pathlib import Path
 
 import numpy as np
-from joblib import dump
+from joblib import dump, load
+from pytket import Circuit
+from pytket.extensions.qiskit import tk_to_qiskit
 from qiskit import QuantumCircuit
+from qiskit.circuit import Clbit
 from qiskit.test.mock.backends import FakeMontreal, FakeWashington
 
 
@@ -115,6 +132,56 @@ def get_index_to_comppath_LUT():
     return index_to_comppath_LUT
 
 
+def get_device_max_qubits():
+    """Returns a dictionary mapping each device name to its number of qubits."""
+    device_max_qubits = {}
+    for devices in get_compilation_pipeline()["devices"].values():
+        for device_name, max_qubits in devices:
+            device_max_qubits[device_name] = max_qubits
+    return device_max_qubits
+
+
+def get_comp_path_max_qubits():
+    """Returns an array of the number of qubits of the device of each compilation path, indexed by the LUT index."""
+    device_max_qubits = get_device_max_qubits()
+    LUT = get_index_to_comppath_LUT()
+    return np.array([device_max_qubits[LUT[i][1]] for i in range(len(LUT))])
+
+
+def get_qasm_size(qasm_path: str):
+    """Returns a cheap estimate of the (number of qubits, number of gates) of a qasm file without parsing it. The
+    number of gates is approximated by the number of statements."""
+    num_qubits = 0
+    num_statements = 0
+    with open(qasm_path) as f:
+        for line in f:
+            num_statements += line.count(";")
+            if line.lstrip().startswith("qreg"):
+                num_qubits += int(line.split("[", 1)[1].split("]", 1)[0])
+    return num_qubits, num_statements
+
+
+def get_compiled_circuit_index(directory: str):
+    """Returns a dictionary mapping each circuit name to a list of (comp_path_index, path) of all its compiled
+    circuits in a directory, named "<circuit name>_<comp_path_index>.qasm", by scanning the directory once."""
+    num_comp_paths = len(get_index_to_comppath_LUT())
+    compiled_circuit_index = {}
+    for path in Path(directory).iterdir():
+        if path.suffix != ".qasm":
+            continue
+        circuit_name, _, comp_path_index = path.stem.rpartition("_")
+        if (
+            not circuit_name
+            or not comp_path_index.isdigit()
+            or int(comp_path_index) >= num_comp_paths
+        ):
+            continue
+        compiled_circuit_index.setdefault(circuit_name, []).append(
+            (int(comp_path_index), str(path))
+        )
+    return compiled_circuit_index
+
+
 def dict_to_featurevector(gate_dict):
     """Calculates and returns the feature vector of a given quantum circuit gate dictionary."""
     res_dct = dict.fromkeys(get_openqasm_gates(), 0)
@@ -125,174 +192,583 @@ def dict_to_featurevector(gate_dict):
     return res_dct
 
 
-def timeout_watcher(func, args, timeout):
-    """Method that stops a function call after a given timeout limit."""
+@dataclass
+class TaskResult:
+    """Result of a function call executed by a TimeoutWorker.
 
-    class TimeoutException(Exception):  # Custom exception class
-        pass
+    status -- "success", "timeout" or "error"
+    value -- return value of the function call, None if it did not succeed
+    duration -- wall-clock time of the call in seconds
+    error -- description of the error if the call did not succeed
+    """
 
-    def timeout_handler(signum, frame):  # Custom signal handler
-        raise TimeoutException
+    status: str
+    value: object = None
+    duration: float = 0.0
+    error: str = None
 
-    # Change the behavior of SIGALRM
-    signal.signal(signal.SIGALRM, timeout_handler)
+    @property
+    def succeeded(self):
+        return self.status == "success"
 
-    signal.alarm(timeout)
-    try:
-        res = func(*args)
-    except TimeoutException:
+
+def run_timeout_worker(connection):
+    """Main loop of a TimeoutWorker process receiving (func, args) tasks and sending back their results."""
+    connection.send("ready")
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        func, args = task
+        try:
+            result = ("success", func(*args), None)
+        except Exception as e:
+            result = ("error", None, repr(e))
+        try:
+            connection.send(result)
+        except Exception as e:
+            # e.g., the return value cannot be pickled
+            connection.send(("error", None, repr(e)))
+
+
+def get_timeout_worker_context():
+    """Returns the multiprocessing context of the TimeoutWorker processes. They are started by a fork server or
+    spawned instead of being forked, since forking the threads they are started from, e.g., by joblib, may deadlock."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class TimeoutWorker:
+    """Reusable worker process executing function calls with a hard wall-clock time limit.
+
+    In contrast to signal based timeouts, this works from any thread and also stops calls that are stuck in native
+    code. If a call exceeds its time limit, only this worker process is killed and it is respawned for the next call.
+    Functions and arguments must be picklable and importable by the worker process. A worker executes one call at a
+    time.
+    """
+
+    def __init__(self):
+        self.process = None
+        self.connection = None
+
+    def start(self):
+        context = get_timeout_worker_context()
+        connection, child_connection = context.Pipe()
+        process = context.Process(
+            target=run_timeout_worker, args=(child_connection,), daemon=True
+        )
+        process.start()
+        child_connection.close()
+        self.process, self.connection = process, connection
+        # Waits until the worker process has imported its modules, which must not count towards the time limit
+        connection.recv()
+
+    def kill(self):
+        # May be called concurrently by the thread running a call and by TimeoutExecutor.shutdown
+        process, connection = self.process, self.connection
+        self.process = None
+        self.connection = None
+        if process is not None:
+            process.kill()
+            process.join()
+        if connection is not None:
+            connection.close()
+
+    def run(self, func, args, timeout: float):
+        """Executes func(*args) in the worker process and returns a TaskResult.
+
+        Keyword arguments:
+        func -- function to be executed
+        args -- list of arguments of the function
+        timeout -- time limit in seconds
+        """
+        if self.process is None or not self.process.is_alive():
+            self.kill()
+            try:
+                self.start()
+            except (EOFError, OSError) as e:
+                if self.process is None:
+                    return TaskResult("error", error="Worker process was killed")
+                self.kill()
+                return TaskResult(
+                    "error", error="Worker process could not be started: " + repr(e)
+                )
+
+        # The worker may be killed concurrently by TimeoutExecutor.shutdown, which resets self.connection
+        connection = self.connection
+        start_time = time.perf_counter()
+        try:
+            connection.send((func, args))
+            if connection.poll(timeout):
+                status, value, error = connection.recv()
+                return TaskResult(
+                    status, value, time.perf_counter() - start_time, error
+                )
+        except (EOFError, OSError) as e:
+            if self.connection is not connection:
+                return TaskResult(
+                    "error",
+                    duration=time.perf_counter() - start_time,
+                    error="Worker process was killed",
+                )
+            self.kill()
+            return TaskResult(
+                "error",
+                duration=time.perf_counter() - start_time,
+                error="Worker process died: " + repr(e),
+            )
+        except Exception as e:
+            # e.g., the function or its arguments cannot be pickled
+            return TaskResult(
+                "error", duration=time.perf_counter() - start_time, error=repr(e)
+            )
+
+        if self.connection is not connection:
+            return TaskResult(
+                "error",
+                duration=time.perf_counter() - start_time,
+                error="Worker process was killed",
+            )
+        self.kill()
+        return TaskResult(
+            "timeout",
+            duration=time.perf_counter() - start_time,
+            error="Exceeded timeout limit of " + str(timeout) + "s",
+        )
+
+    def close(self):
+        """Stops the worker process after its current call."""
+        if self.process is not None and self.process.is_alive():
+            with contextlib.suppress(OSError):
+                self.connection.send(None)
+            self.process.join(timeout=1)
+        self.kill()
+
+
+class TimeoutExecutor:
+    """Executes function calls concurrently on a fixed number of reusable TimeoutWorker processes, each call with
+    its own wall-clock time limit. Calls are submitted from the calling thread and their TaskResults are returned as
+    futures."""
+
+    def __init__(self, max_workers: int = None):
+        if max_workers is None or max_workers < 1:
+            max_workers = os.cpu_count() or 1
+        self.max_workers = max_workers
+        self.workers = [TimeoutWorker() for _ in range(max_workers)]
+        self.idle_workers = queue.SimpleQueue()
+        for worker in self.workers:
+            self.idle_workers.put(worker)
+        self.thread_pool = ThreadPoolExecutor(max_workers)
+        self.pending_futures = set()
+
+    def run(self, func, args, timeout: float):
+        worker = self.idle_workers.get()
+        try:
+            return worker.run(func, args, timeout)
+        finally:
+            self.idle_workers.put(worker)
+
+    def submit(self, func, args, timeout: float):
+        """Returns a future of the TaskResult of func(*args)."""
+        future = self.thread_pool.submit(self.run, func, args, timeout)
+        self.pending_futures.add(future)
+        future.add_done_callback(self.pending_futures.discard)
+        return future
+
+    def map(self, func, args_list, timeout: float):
+        """Returns the TaskResults of func(*args) for all args in args_list in order."""
+        futures = [self.submit(func, args, timeout) for args in args_list]
+        return [future.result() for future in futures]
+
+    def shutdown(self, kill: bool = False):
+        """Stops all workers. Calls that have not started yet are cancelled. If kill is set, running calls are
+        aborted instead of awaited."""
+        # Cancelled by hand since shutdown(cancel_futures=True) requires Python 3.9
+        for future in list(self.pending_futures):
+            future.cancel()
+        if kill:
+            self.thread_pool.shutdown(wait=False)
+            for worker in self.workers:
+                worker.kill()
+        else:
+            self.thread_pool.shutdown(wait=True)
+            for worker in self.workers:
+                worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+
+timeout_workers = threading.local()
+
+
+def get_timeout_worker():
+    """Returns the TimeoutWorker of the calling thread."""
+    if not hasattr(timeout_workers, "worker"):
+        timeout_workers.worker = TimeoutWorker()
+    return timeout_workers.worker
+
+
+def timeout_watcher(func, args, timeout):
+    """Method that stops a function call after a given timeout limit.
+
+    The call is executed in a reusable worker process of the calling thread so that it may be used from any thread.
+    Returns the result of the call and False if it exceeded the timeout or failed.
+    """
+    result = get_timeout_worker().run(func, args, timeout)
+    if result.status == "timeout":
         print("Calculation/Generation exceeded timeout limit for ", func, args[1:])
         return False
-    except Exception as e:
-        print("Something else went wrong: ", e)
+    if result.status == "error":
+        print("Something else went wrong: ", result.error)
         return False
-    else:
-        # Reset the alarm
-        signal.alarm(0)
+    return result.value
 
-    return res
+
+def get_score_gate_names():
+    """Returns the names of all operations that may occur in compiled quantum circuits. The position of a name is
+    used as its gate index within the fidelity tables."""
+    gate_names = ["rz", "sx", "x", "rx", "ry", "measure", "cx", "ecr", "cz", "rxx"]
+    return gate_names
 
 
 def calc_eval_score_for_qc(qc_path: str, device: str):
+    """Returns the evaluation score, i.e., the expected fidelity, of a compiled quantum circuit for a device.
+
+    Keyword arguments:
+    qc_path -- path to the compiled qasm file or the compiled quantum circuit itself
+    device -- name of the device the circuit is compiled for
+    """
+    if isinstance(qc_path, QuantumCircuit):
+        qc = qc_path
+    else:
+        try:
+            qc = QuantumCircuit.from_qasm_file(qc_path)
+        except Exception as e:
+            print("Fail in calc_eval_score_for_qc: ", e)
+            return get_width_penalty()
+
+    calibration = get_device_calibrations().get(device)
+    if calibration is None:
+        print("Error: No suitable backend found!")
+        return 1
+
+    return calibration.calc_score(*get_gate_arrays(qc))
+
+
+def get_gate_arrays(qc: QuantumCircuit):
+    """Maps a compiled quantum circuit to integer arrays. Barriers are omitted.
+
+    Return values:
+    gate_ids -- index of each operation within get_score_gate_names(), -1 for unknown operations
+    first_qubits -- index of the first qubit of each operation
+    second_qubits -- index of the second qubit of each operation, -1 for single-qubit operations
+    """
+    gate_name_to_id = {name: i for i, name in enumerate(get_score_gate_names())}
+    qubit_indices = {qubit: i for i, qubit in enumerate(qc.qubits)}
+
+    gate_ids = []
+    first_qubits = []
+    second_qubits = []
+    for instruction, qargs, _cargs in qc.data:
+        if instruction.name == "barrier":
+            continue
+        assert len(qargs) in [1, 2]
+        gate_ids.append(gate_name_to_id.get(instruction.name, -1))
+        first_qubits.append(qubit_indices[qargs[0]])
+        second_qubits.append(qubit_indices[qargs[1]] if len(qargs) == 2 else -1)
+
+    return (
+        np.array(gate_ids, dtype=np.int64),
+        np.array(first_qubits, dtype=np.int64),
+        np.array(second_qubits, dtype=np.int64),
+    )
+
+
+def load_gate_arrays(qasm_path: str):
+    """Returns the gate arrays (see get_gate_arrays) of a compiled qasm file in compact integer types and None if it
+    cannot be parsed."""
     try:
-        qc = QuantumCircuit.from_qasm_file(qc_path)
+        qc = QuantumCircuit.from_qasm_file(qasm_path)
     except Exception as e:
-        print("Fail in calc_eval_score_for_qc: ", e)
-        return get_width_penalty()
-    res = 1
+        print("Fail in load_gate_arrays: ", e)
+        return None
+    gate_ids, first_qubits, second_qubits = get_gate_arrays(qc)
+    return (
+        gate_ids.astype(np.int8),
+        first_qubits.astype(np.int16),
+        second_qubits.astype(np.int16),
+    )
+
+
+@dataclass(frozen=True)
+class DeviceCalibration:
+    """Immutable fidelity tables of a device with the log fidelities of all single-qubit operations (indexed by gate
+    index and qubit) and of all two-qubit operations (indexed by both qubits). Single-qubit operations not supported
+    by the device are marked as NaN."""
+
+    name: str
+    log_fid_1Q: np.ndarray
+    log_fid_2Q: np.ndarray
+    two_qubit_gate_id: int
+
+    def __post_init__(self):
+        self.log_fid_1Q.setflags(write=False)
+        self.log_fid_2Q.setflags(write=False)
+
+    @property
+    def num_qubits(self):
+        return self.log_fid_2Q.shape[0]
+
+    @cached_property
+    def version(self):
+        """Hash identifying the calibration data."""
+        sha = hashlib.sha256(self.name.encode())
+        sha.update(self.log_fid_1Q.tobytes())
+        sha.update(self.log_fid_2Q.tobytes())
+        sha.update(str(self.two_qubit_gate_id).encode())
+        return sha.hexdigest()[:16]
+
+    def calc_score(
+        self, gate_ids: np.ndarray, first_qubits: np.ndarray, second_qubits: np.ndarray
+    ):
+        """Returns the evaluation score of a compiled quantum circuit given as gate arrays (see get_gate_arrays) as
+        the exponential of the sum of all log fidelities."""
+        is_2Q = second_qubits >= 0
+        gate_ids_1Q = gate_ids[~is_2Q]
+        assert np.all(gate_ids_1Q >= 0)
+        assert np.all(gate_ids[is_2Q] == self.two_qubit_gate_id)
+
+        log_fidelities_1Q = self.log_fid_1Q[gate_ids_1Q, first_qubits[~is_2Q]]
+        assert not np.any(np.isnan(log_fidelities_1Q))
+        log_fidelities_2Q = self.log_fid_2Q[first_qubits[is_2Q], second_qubits[is_2Q]]
+
+        return float(np.exp(np.sum(log_fidelities_1Q) + np.sum(log_fidelities_2Q)))
+
+    def calc_scores(
+        self,
+        gate_ids: np.ndarray,
+        first_qubits: np.ndarray,
+        second_qubits: np.ndarray,
+        offsets: np.ndarray,
+    ):
+        """Returns the evaluation scores of many compiled quantum circuits at once. The gate arrays of all circuits
+        (see get_gate_arrays) are concatenated and the operations of circuit i are the ones from offsets[i] to
+        offsets[i + 1]. Circuits with operations or qubits not supported by the device are scored NaN."""
+        first_qubits = np.asarray(first_qubits, dtype=np.int64)
+        second_qubits = np.asarray(second_qubits, dtype=np.int64)
+        gate_ids = np.asarray(gate_ids, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+
+        is_2Q = second_qubits >= 0
+        valid = (
+            (first_qubits >= 0)
+            & (first_qubits < self.num_qubits)
+            & (second_qubits < self.num_qubits)
+            & np.where(is_2Q, gate_ids == self.two_qubit_gate_id, gate_ids >= 0)
+        )
+        first_qubits = np.where(valid, first_qubits, 0)
+        second_qubits = np.where(valid & is_2Q, second_qubits, 0)
+        gate_ids = np.where(valid & ~is_2Q, gate_ids, 0)
+        log_fidelities = np.where(
+            is_2Q,
+            self.log_fid_2Q[first_qubits, second_qubits],
+            self.log_fid_1Q[gate_ids, first_qubits],
+        )
+        log_fidelities[~valid] = np.nan
+
+        # Sums per circuit, empty circuits are skipped since reduceat does not support empty segments
+        sums = np.zeros(len(offsets) - 1)
+        non_empty = offsets[1:] > offsets[:-1]
+        if np.any(non_empty):
+            sums[non_empty] = np.add.reduceat(log_fidelities, offsets[:-1][non_empty])
+        return np.exp(sums)
+
 
-    if "ibm_montreal" in device or "ibm_washington" in device:
+def build_device_calibration(device: str):
+    """Builds the calibration of a device from its calibration data. Returns None for unknown devices."""
+    gate_names = get_score_gate_names()
+    gate_name_to_id = {name: i for i, name in enumerate(gate_names)}
 
-        if "ibm_montreal" in device:
-            backend = ibm_montreal_calibration
+    if device in ["ibm_montreal", "ibm_washington"]:
+        if device == "ibm_montreal":
+            backend = FakeMontreal().properties()
         else:
-            backend = ibm_washington_calibration
-        for instruction, qargs, _cargs in qc.data:
-            gate_type = instruction.name
-            qubit_indices = [elem.index for elem in qargs]
-
-            assert gate_type in ["rz", "sx", "x", "cx", "measure", "barrier"]
-
-            if gate_type != "barrier":
-                assert len(qubit_indices) in [1, 2]
-
-                first_qubit = int(qubit_indices[0])
-                if len(qubit_indices) == 1 and gate_type != "measure":
-                    specific_error = backend.gate_error(gate_type, [first_qubit])
-                elif len(qubit_indices) == 1 and gate_type == "measure":
-                    specific_error = backend.readout_error(first_qubit)
-                elif len(qubit_indices) == 2:
-                    second_qubit = int(qubit_indices[1])
-                    specific_error = backend.gate_error(
-                        gate_type, [first_qubit, second_qubit]
-                    )
-
-                res *= 1 - float(specific_error)
-
-    elif "oqc_lucy" in device:
-        for instruction, qargs, _cargs in qc.data:
-            gate_type = instruction.name
-            qubit_indices = [elem.index for elem in qargs]
-
-            assert gate_type in ["rz", "sx", "x", "ecr", "measure", "barrier"]
-            if gate_type != "barrier":
-                assert len(qubit_indices) in [1, 2]
-
-                first_qubit = int(qubit_indices[0])
-                if len(qubit_indices) == 1 and gate_type != "measure":
-                    specific_fidelity = oqc_lucy_calibration["fid_1Q"][str(first_qubit)]
-                elif len(qubit_indices) == 1 and gate_type == "measure":
-                    specific_fidelity = oqc_lucy_calibration["fid_1Q_readout"][
-                        str(first_qubit)
-                    ]
-                elif len(qubit_indices) == 2:
-                    second_qubit = int(qubit_indices[1])
-                    tmp = str(first_qubit) + "-" + str(second_qubit)
-                    if oqc_lucy_calibration["fid_2Q"].get(tmp) is None:
-                        specific_fidelity = oqc_lucy_calibration["avg_2Q"]
-                    else:
-                        specific_fidelity = oqc_lucy_calibration["fid_2Q"][tmp]
-
-                res *= specific_fidelity
-    elif "rigetti_aspen_m1" in device:
+            backend = FakeWashington().properties()
+        num_qubits = len(backend.qubits)
+        two_qubit_gate = "cx"
+        fid_1Q = np.full((len(gate_names), num_qubits), np.nan)
+        for gate_type in ["rz", "sx", "x"]:
+            for qubit in range(num_qubits):
+                fid_1Q[gate_name_to_id[gate_type], qubit] = 1 - float(
+                    backend.gate_error(gate_type, [qubit])
+                )
+        for qubit in range(num_qubits):
+            fid_1Q[gate_name_to_id["measure"], qubit] = 1 - float(
+                backend.readout_error(qubit)
+            )
+        fid_2Q = np.full((num_qubits, num_qubits), np.nan)
+        for gate in backend.gates:
+            if gate.gate == two_qubit_gate and len(gate.qubits) == 2:
+                fid_2Q[gate.qubits[0], gate.qubits[1]] = 1 - float(
+                    backend.gate_error(gate.gate, gate.qubits)
+                )
+        fid_2Q[np.isnan(fid_2Q)] = np.nanmean(fid_2Q)
+
+    elif device == "oqc_lucy":
+        oqc_lucy_calibration = parse_oqc_calibration_config()
+        num_qubits = len(oqc_lucy_calibration["fid_1Q"])
+        two_qubit_gate = "ecr"
+        fid_1Q = np.full((len(gate_names), num_qubits), np.nan)
+        for qubit in range(num_qubits):
+            for gate_type in ["rz", "sx", "x"]:
+                fid_1Q[gate_name_to_id[gate_type], qubit] = oqc_lucy_calibration[
+                    "fid_1Q"
+                ][str(qubit)]
+            fid_1Q[gate_name_to_id["measure"], qubit] = oqc_lucy_calibration[
+                "fid_1Q_readout"
+            ][str(qubit)]
+        fid_2Q = np.full((num_qubits, num_qubits), oqc_lucy_calibration["avg_2Q"])
+        for qubit_pair, fidelity in oqc_lucy_calibration["fid_2Q"].items():
+            first_qubit, second_qubit = (int(qubit) for qubit in qubit_pair.split("-"))
+            if fidelity is not None:
+                fid_2Q[first_qubit, second_qubit] = fidelity
+
+    elif device == "rigetti_aspen_m1":
+        rigetti_m1_calibration = parse_rigetti_calibration_config()
         mapping = get_rigetti_qubit_dict()
-        for instruction, qargs, _cargs in qc.data:
-            gate_type = instruction.name
-            qubit_indices = [elem.index for elem in qargs]
-
-            assert gate_type in ["rx", "rz", "cz", "measure", "barrier"]
-            if gate_type != "barrier":
-                assert len(qubit_indices) in [1, 2]
-
-                first_qubit = int(qubit_indices[0])
-                if len(qubit_indices) == 1 and gate_type in ["rx", "rz", "cz"]:
-                    specific_fidelity = rigetti_m1_calibration["fid_1Q"][
-                        mapping.get(str(first_qubit))
-                    ]
-                elif len(qubit_indices) == 1 and gate_type == "measure":
-                    specific_fidelity = rigetti_m1_calibration["fid_1Q_readout"][
-                        mapping.get(str(first_qubit))
-                    ]
-                elif len(qubit_indices) == 2:
-                    second_qubit = int(qubit_indices[1])
-                    tmp = (
-                        str(
-                            min(
-                                int(mapping.get(str(first_qubit))),
-                                int(mapping.get(str(second_qubit))),
-                            )
-                        )
-                        + "-"
-                        + str(
-                            max(
-                                int(mapping.get(str(first_qubit))),
-                                int(mapping.get(str(second_qubit))),
-                            )
-                        )
-                    )
-                    if (
-                        rigetti_m1_calibration["fid_2Q_CZ"].get(tmp) is None
-                        or rigetti_m1_calibration["fid_2Q_CZ"][tmp] is None
-                    ):
-                        specific_fidelity = rigetti_m1_calibration["avg_2Q"]
-                    else:
-                        specific_fidelity = rigetti_m1_calibration["fid_2Q_CZ"][tmp]
-
-                res *= specific_fidelity
-
-    elif "ionq11" in device:
-        for instruction, qargs, _cargs in qc.data:
-            gate_type = instruction.name
-            qubit_indices = [elem.index for elem in qargs]
-
-            assert gate_type in ["rxx", "rz", "ry", "rx", "measure", "barrier"]
-            if gate_type != "barrier":
-                assert len(qubit_indices) in [1, 2]
-
-                if len(qubit_indices) == 1:
-                    specific_fidelity = ionq_calibration["avg_1Q"]
-                elif len(qubit_indices) == 2:
-                    specific_fidelity = ionq_calibration["avg_2Q"]
-                res *= specific_fidelity
+        num_qubits = len(mapping)
+        two_qubit_gate = "cz"
+        fid_1Q = np.full((len(gate_names), num_qubits), np.nan)
+        for qubit in range(num_qubits):
+            rigetti_qubit = mapping.get(str(qubit))
+            for gate_type in ["rx", "rz"]:
+                fid_1Q[gate_name_to_id[gate_type], qubit] = rigetti_m1_calibration[
+                    "fid_1Q"
+                ][rigetti_qubit]
+            fid_1Q[gate_name_to_id["measure"], qubit] = rigetti_m1_calibration[
+                "fid_1Q_readout"
+            ][rigetti_qubit]
+        fid_2Q = np.full((num_qubits, num_qubits), rigetti_m1_calibration["avg_2Q"])
+        for first_qubit in range(num_qubits):
+            for second_qubit in range(num_qubits):
+                first_rigetti_qubit = int(mapping.get(str(first_qubit)))
+                second_rigetti_qubit = int(mapping.get(str(second_qubit)))
+                fidelity = rigetti_m1_calibration["fid_2Q_CZ"].get(
+                    str(min(first_rigetti_qubit, second_rigetti_qubit))
+                    + "-"
+                    + str(max(first_rigetti_qubit, second_rigetti_qubit))
+                )
+                if fidelity is not None:
+                    fid_2Q[first_qubit, second_qubit] = fidelity
+
+    elif device == "ionq11":
+        ionq_calibration = parse_ionq_calibration_config()
+        num_qubits = 11
+        two_qubit_gate = "rxx"
+        fid_1Q = np.full((len(gate_names), num_qubits), np.nan)
+        for gate_type in ["rz", "ry", "rx", "measure"]:
+            fid_1Q[gate_name_to_id[gate_type], :] = ionq_calibration["avg_1Q"]
+        fid_2Q = np.full((num_qubits, num_qubits), ionq_calibration["avg_2Q"])
+
     else:
-        print("Error: No suitable backend found!")
+        return None
+
+    with np.errstate(divide="ignore"):
+        return DeviceCalibration(
+            name=device,
+            log_fid_1Q=np.log(fid_1Q),
+            log_fid_2Q=np.log(fid_2Q),
+            two_qubit_gate_id=gate_name_to_id[two_qubit_gate],
+        )
 
-    return res
+
+# Calibrations of all devices, built once per process
+device_calibrations = {}
+# Calibration snapshots that match the calibrations in use or that were already reported as ignored
+device_calibration_snapshots = set()
+
+
+def get_device_calibrations(snapshot_path: str = None):
+    """Returns the calibrations of all devices of the compilation pipeline as an immutable mapping from device name
+    to DeviceCalibration. They are built once per process, either from the calibration data or, if provided, from a
+    calibration snapshot created by save_calibration_snapshot().
+
+    Raises a FileNotFoundError if the provided snapshot does not exist. A snapshot provided after the calibrations
+    are built is ignored with a warning, unless it was created from or loaded into them.
+    """
+    if snapshot_path is not None:
+        snapshot_path = str(snapshot_path)
+        if not Path(snapshot_path).is_file():
+            raise FileNotFoundError("Calibration snapshot not found: " + snapshot_path)
+        if device_calibrations and snapshot_path not in device_calibration_snapshots:
+            print(
+                "Calibration snapshot is ignored, since the device calibrations are already built: ",
+                snapshot_path,
+            )
+            device_calibration_snapshots.add(snapshot_path)
+
+    if not device_calibrations:
+        if snapshot_path is not None:
+            calibrations = load_calibration_snapshot(snapshot_path)
+            device_calibration_snapshots.add(snapshot_path)
+        else:
+            calibrations = {}
+            for devices in get_compilation_pipeline()["devices"].values():
+                for device_name, _max_qubits in devices:
+                    calibrations[device_name] = build_device_calibration(device_name)
+        device_calibrations.update(calibrations)
+
+    return MappingProxyType(device_calibrations)
+
+
+def get_calibration_versions():
+    """Returns a dictionary mapping each device name to the version of its calibration."""
+    return {
+        device: calibration.version
+        for device, calibration in get_device_calibrations().items()
+    }
+
+
+def save_calibration_snapshot(path: str):
+    """Saves the calibrations of all devices into a compact binary snapshot."""
+    arrays = {}
+    for device_name, calibration in get_device_calibrations().items():
+        arrays[device_name + ".log_fid_1Q"] = calibration.log_fid_1Q
+        arrays[device_name + ".log_fid_2Q"] = calibration.log_fid_2Q
+        arrays[device_name + ".two_qubit_gate_id"] = np.array(
+            calibration.two_qubit_gate_id
+        )
+    with open(path, "wb") as f:
+        np.savez(f, **arrays)
+    device_calibration_snapshots.add(str(path))
+
+
+def load_calibration_snapshot(path: str):
+    """Loads the calibrations of all devices from a snapshot created by save_calibration_snapshot()."""
+    calibrations = {}
+    with np.load(path) as snapshot:
+        device_names = {key.rsplit(".", 1)[0] for key in snapshot.files}
+        for device_name in device_names:
+            calibrations[device_name] = DeviceCalibration(
+                name=device_name,
+                log_fid_1Q=snapshot[device_name + ".log_fid_1Q"],
+                log_fid_2Q=snapshot[device_name + ".log_fid_2Q"],
+                two_qubit_gate_id=int(snapshot[device_name + ".two_qubit_gate_id"]),
+            )
+    return calibrations
 
 
 def init_all_config_files():
     try:
-        global ibm_montreal_calibration
-        ibm_montreal_calibration = FakeMontreal().properties()
-        global ibm_washington_calibration
-        ibm_washington_calibration = FakeWashington().properties()
-        global oqc_lucy_calibration
-        oqc_lucy_calibration = parse_oqc_calibration_config()
-        global rigetti_m1_calibration
-        rigetti_m1_calibration = parse_rigetti_calibration_config()
-        global ionq_calibration
-        ionq_calibration = parse_ionq_calibration_config()
-
+        get_device_calibrations()
     except Exception as e:
         print("init_all_config_files() failed: ", e)
         return False
@@ -300,21 +776,22 @@ def init_all_config_files():
         return True
 
 
-def create_feature_dict(qasm_str_or_path: str):
-
-    if len(qasm_str_or_path) < 260 and Path(qasm_str_or_path).exists():
-        qc = QuantumCircuit.from_qasm_file(qasm_str_or_path)
-    elif "OPENQASM" in qasm_str_or_path:
-        qc = QuantumCircuit.from_qasm_str(qasm_str_or_path)
-    else:
-        print("Neither a qasm file path nor a qasm str has been provided.")
+def create_feature_dict(qasm_str_or_path: str | QuantumCircuit | Circuit):
+    """Returns the feature dictionary for a given qasm file path, qasm string, QuantumCircuit or pytket Circuit and
+    False if it cannot be created."""
+    qc = load_quantum_circuit(qasm_str_or_path)
+    if qc is None:
         return False
+    return create_feature_dict_for_qc(qc)
+
 
-    ops_list = qc.count_ops()
+def create_feature_dict_for_qc(qc: QuantumCircuit):
+    """Returns the feature dictionary for an already parsed quantum circuit."""
+    ops_list, depth, supermarq_features = calc_circuit_features(qc)
     feature_dict = dict_to_featurevector(ops_list)
 
     feature_dict["num_qubits"] = qc.num_qubits
-    feature_dict["depth"] = qc.depth()
+    feature_dict["depth"] = depth
 
     (
         program_communication,
@@ -322,7 +799,7 @@ def create_feature_dict(qasm_str_or_path: str):
         entanglement_ratio,
         parallelism,
         liveness,
-    ) = calc_supermarq_features(qc)
+    ) = supermarq_features
     feature_dict["program_communication"] = program_communication
     feature_dict["critical_depth"] = critical_depth
     feature_dict["entanglement_ratio"] = entanglement_ratio
@@ -332,6 +809,123 @@ def create_feature_dict(qasm_str_or_path: str):
     return feature_dict
 
 
+def create_feature_dicts(
+    qasm_str_or_paths,
+    n_jobs: int = -1,
+    max_in_flight: int = None,
+    feature_cache=None,
+):
+    """Yields the feature dictionaries for a stream of qasm file paths or qasm strings in their original order.
+
+    Keyword arguments:
+    qasm_str_or_paths -- iterable of qasm file paths or qasm strings
+    n_jobs -- number of worker processes, -1 uses all available cores and 1 calculates in the calling process
+    max_in_flight -- maximum number of circuits handed to the workers at the same time, defaults to 2 * n_jobs
+    feature_cache -- optional FeatureCache (see mqt.predictor.cache) consulted before any circuit is parsed
+
+    Return values:
+    feature_dict -- feature dictionary of the respective circuit or False if it could not be created
+    """
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+
+    if max_in_flight is None:
+        max_in_flight = 2 * n_jobs
+
+    # Entries are pairs of the cache key (None if the result must not be cached) and either the feature dictionary
+    # itself or the future calculating it
+    in_flight = deque()
+
+    def pop_result():
+        key, res = in_flight.popleft()
+        if isinstance(res, Future):
+            res = res.result()
+        if key is not None and res:
+            feature_cache.put(key, res)
+        return res
+
+    executor = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+    try:
+        for qasm_str_or_path in qasm_str_or_paths:
+            key = None
+            feature_dict = None
+            if feature_cache is not None:
+                key = feature_cache.get_key(qasm_str_or_path)
+                feature_dict = feature_cache.get(key)
+
+            if feature_dict is not None:
+                in_flight.append((None, feature_dict))
+            elif executor is None:
+                in_flight.append((key, create_feature_dict(qasm_str_or_path)))
+            else:
+                in_flight.append(
+                    (key, executor.submit(create_feature_dict, qasm_str_or_path))
+                )
+
+            while len(in_flight) > (0 if executor is None else max_in_flight):
+                yield pop_result()
+
+        while in_flight:
+            yield pop_result()
+    finally:
+        if executor is not None:
+            # The remaining circuits are cancelled by hand since shutdown(cancel_futures=True) requires Python 3.9
+            for _key, res in in_flight:
+                if isinstance(res, Future):
+                    res.cancel()
+            executor.shutdown()
+
+
+def get_feature_schema_version():
+    """Returns the version of the features created by create_feature_dict. It must be increased whenever the
+    features change, e.g., to invalidate cached features."""
+    feature_schema_version = 1
+    return feature_schema_version
+
+
+def is_qasm_file_path(qasm_str_or_path: str):
+    """Returns whether a given string is the path of an existing file."""
+    if not isinstance(qasm_str_or_path, str):
+        return False
+    with contextlib.suppress(OSError):
+        return len(qasm_str_or_path) < 260 and Path(qasm_str_or_path).is_file()
+    return False
+
+
+def read_qasm_str(qasm_str_or_path: str):
+    """Returns the qasm string for a given qasm file path or qasm string and None if neither is provided, e.g., for
+    circuit objects."""
+    if is_qasm_file_path(qasm_str_or_path):
+        return Path(qasm_str_or_path).read_text()
+    if isinstance(qasm_str_or_path, str) and "OPENQASM" in qasm_str_or_path:
+        return qasm_str_or_path
+    return None
+
+
+def load_quantum_circuit(qasm_str_or_path: str | QuantumCircuit | Circuit):
+    """Returns the quantum circuit for a given qasm file path, qasm string, QuantumCircuit or pytket Circuit and None
+    if neither is provided or the circuit cannot be parsed. Circuit objects are used directly without any qasm
+    round trip."""
+    if isinstance(qasm_str_or_path, QuantumCircuit):
+        return qasm_str_or_path
+
+    try:
+        if isinstance(qasm_str_or_path, Circuit):
+            return tk_to_qiskit(qasm_str_or_path)
+        if is_qasm_file_path(qasm_str_or_path):
+            return QuantumCircuit.from_qasm_file(qasm_str_or_path)
+        if isinstance(qasm_str_or_path, str) and "OPENQASM" in qasm_str_or_path:
+            return QuantumCircuit.from_qasm_str(qasm_str_or_path)
+    except Exception as e:
+        print("Fail in load_quantum_circuit: ", e)
+        return None
+
+    print(
+        "Neither a qasm file path, a qasm str nor a quantum circuit has been provided."
+    )
+    return None
+
+
 def get_rigetti_qubit_dict():
     mapping = {
         "32": "4",
@@ -516,42 +1110,91 @@ def parse_rigetti_calibration_config():
 
 
 def calc_supermarq_features(qc: QuantumCircuit):
-
-    connectivity = []
-    liveness_A_matrix = 0
-    for _ in range(qc.num_qubits):
-        connectivity.append([])
-
-    offset = 0
-    qubit_indices = []
-    for elem in qc.qregs:
-        for i in range(elem.size):
-            qubit_indices.append(offset + i)
-        offset += elem.size
-
-    for instruction, _, _ in qc.data:
-        gate_type = instruction.name
-        liveness_A_matrix += len(qubit_indices)
-        if gate_type != "barrier":
-            all_indices = set(qubit_indices)
-            for qubit_index in all_indices:
-                to_be_added_entries = all_indices.copy()
-                to_be_added_entries.remove(int(qubit_index))
-                connectivity[int(qubit_index)].extend(to_be_added_entries)
-
-    for i in range(qc.num_qubits):
-        connectivity[i] = len(set(connectivity[i]))
-
-    num_gates = sum(qc.count_ops().values())
-    num_multiple_qubit_gates = qc.num_nonlocal_gates()
-    depth = qc.depth()
-    program_communication = np.sum(connectivity) / (qc.num_qubits * (qc.num_qubits - 1))
+    """Returns the supermarq features program communication, critical depth, entanglement ratio, parallelism and
+    liveness of a quantum circuit."""
+    _, _, supermarq_features = calc_circuit_features(qc)
+    return supermarq_features
+
+
+def calc_circuit_features(qc: QuantumCircuit):
+    """Calculates the gate counts, the depth and the supermarq features of a quantum circuit in a single pass over
+    its instructions.
+
+    Return values:
+    ops_list -- number of occurrences of each operation
+    depth -- depth of the quantum circuit
+    supermarq_features -- tuple of program communication, critical depth, entanglement ratio, parallelism and liveness
+    """
+    bit_indices = {bit: idx for idx, bit in enumerate(qc.qubits + qc.clbits)}
+    num_register_qubits = sum(qreg.size for qreg in qc.qregs)
+
+    # Depth of each qubit and clbit, once counting all non-directive operations (as qc.depth()) and once counting
+    # all multi-qubit operations only (as used for the critical depth)
+    op_stack = [0] * len(bit_indices)
+    multiple_qubit_op_stack = [0] * len(bit_indices)
+
+    # Sparse qubit interaction graph stored as one adjacency bitset per qubit
+    interactions = [0] * qc.num_qubits
+
+    ops_list = {}
+    num_multiple_qubit_gates = 0
+    for instruction, qargs, cargs in qc.data:
+        ops_list[instruction.name] = ops_list.get(instruction.name, 0) + 1
+        is_directive = getattr(instruction, "_directive", False)
+        if len(qargs) > 1 and not is_directive:
+            num_multiple_qubit_gates += 1
+
+        reg_ints = [bit_indices[bit] for bit in qargs + cargs]
+        if len(qargs) > 1 and instruction.name != "barrier":
+            qubits_mask = 0
+            for idx in reg_ints[: len(qargs)]:
+                qubits_mask |= 1 << idx
+            for idx in reg_ints[: len(qargs)]:
+                interactions[idx] |= qubits_mask & ~(1 << idx)
+
+        level_increment = 0 if is_directive else 1
+        multiple_qubit_level_increment = 1 if len(qargs) > 1 else 0
+        levels = [op_stack[idx] + level_increment for idx in reg_ints]
+        multiple_qubit_levels = [
+            multiple_qubit_op_stack[idx] + multiple_qubit_level_increment
+            for idx in reg_ints
+        ]
+
+        # Conditional operations act on all clbits they are conditioned on
+        condition = getattr(instruction, "condition", None)
+        if condition:
+            if isinstance(condition[0], Clbit):
+                condition_bits = [condition[0]]
+            else:
+                condition_bits = condition[0]
+            for cbit in condition_bits:
+                idx = bit_indices[cbit]
+                if idx not in reg_ints:
+                    reg_ints.append(idx)
+                    levels.append(op_stack[idx] + 1)
+                    multiple_qubit_levels.append(multiple_qubit_op_stack[idx] + 1)
+
+        if reg_ints:
+            max_level = max(levels)
+            max_multiple_qubit_level = max(multiple_qubit_levels)
+            for idx in reg_ints:
+                op_stack[idx] = max_level
+                multiple_qubit_op_stack[idx] = max_multiple_qubit_level
+
+    depth = max(op_stack, default=0)
+    num_gates = sum(ops_list.values())
+
+    # Sum of the degrees of all qubits within the interaction graph
+    connectivity = sum(bin(adjacency).count("1") for adjacency in interactions)
+    program_communication = np.int64(connectivity) / (
+        qc.num_qubits * (qc.num_qubits - 1)
+    )
 
     if num_multiple_qubit_gates == 0:
         critical_depth = 0
     else:
         critical_depth = (
-            qc.depth(filter_function=lambda x: len(x[1]) > 1) / num_multiple_qubit_gates
+            max(multiple_qubit_op_stack, default=0) / num_multiple_qubit_gates
         )
 
     entanglement_ratio = num_multiple_qubit_gates / num_gates
@@ -559,95 +1202,482 @@ def calc_supermarq_features(qc: QuantumCircuit):
 
     parallelism = (num_gates / depth - 1) / (qc.num_qubits - 1)
 
+    liveness_A_matrix = len(qc.data) * num_register_qubits
     liveness = liveness_A_matrix / (depth * qc.num_qubits)
 
-    return (
+    supermarq_features = (
         program_communication,
         critical_depth,
         entanglement_ratio,
         parallelism,
         liveness,
     )
+    return ops_list, depth, supermarq_features
+
+
+def get_ecr_gate_definitions():
+    """Returns the qasm definitions of the rzx and ecr gates, which are not part of qelib1.inc."""
+    return [
+        "gate rzx(param0) q0,q1 { h q1; cx q0,q1; rz(param0) q1; cx q0,q1; h q1; }\n",
+        "gate ecr q0,q1 { rzx(pi/4) q0,q1; x q0; rzx(-pi/4) q0,q1; }\n",
+    ]
+
+
+def add_ecr_gate_definitions(lines):
+    """Streams the lines of a qasm circuit and replaces all definitions of the rzx and ecr gates created by the
+    compilers by ones that can be parsed, placed right after the include statement."""
+    for line in lines:
+        if "gate rzx" in line or "gate ecr" in line:
+            continue
+        yield line
+        if line.startswith("include"):
+            yield from get_ecr_gate_definitions()
+
+
+def get_qasm_postprocessing(comp_path_index: int):
+    """Returns the transformation of the qasm lines (see add_ecr_gate_definitions) needed by the compiled circuits
+    of a compilation path or None if they can be used as they are."""
+    gate_set_name = get_index_to_comppath_LUT()[comp_path_index][0]
+    return {"oqc": add_ecr_gate_definitions}.get(gate_set_name)
+
+
+def postprocess_qasm_str(qasm_str: str, comp_path_index: int):
+    """Returns the postprocessed qasm string of a circuit compiled with the given compilation path."""
+    postprocessing = get_qasm_postprocessing(comp_path_index)
+    if postprocessing is None:
+        return qasm_str
+    return "".join(postprocessing(qasm_str.splitlines(keepends=True)))
+
+
+def postprocess_qasm_file(path: str, comp_path_index: int):
+    """Postprocesses a qasm file compiled with the given compilation path right after it has been written. The
+    result is written to a temporary file that replaces the original one atomically."""
+    postprocessing = get_qasm_postprocessing(comp_path_index)
+    if postprocessing is None:
+        return
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(path) as f, open(tmp_path, "w") as tmp_f:
+        tmp_f.writelines(postprocessing(f))
+    os.replace(tmp_path, path)
 
 
 def postprocess_ocr_qasm_files(directory: str = None):
+    """Postprocesses all compiled circuits in a directory that were compiled before the postprocessing became part
+    of the compilation. Since it is idempotent, already postprocessed files stay unchanged."""
     if directory is None:
         directory = str(
             resources.files("mqt.predictor").joinpath("training_samples_compiled")
         )
 
-    for filename in Path(directory).iterdir():
-        filename = str(filename).split("/")[-1]
-        if "qasm" in filename:
-            comp_path_index = int(filename.split("_")[-1].split(".")[0])
-            filepath = str(Path(directory) / filename)
-            # checking if it is a file
-            if comp_path_index >= 24 and comp_path_index <= 27:
-                with open(filepath) as f:
-                    lines = f.readlines()
-                with open(filepath, "w") as f:
-                    for line in lines:
-                        if not (
-                            "gate rzx" in line.strip("\n")
-                            or "gate ecr" in line.strip("\n")
-                        ):
-                            f.write(line)
-                        if "gate ecr" in line.strip("\n"):
-                            f.write(
-                                "gate rzx(param0) q0,q1 { h q1; cx q0,q1; rz(param0) q1; cx q0,q1; h q1; }\n"
-                            )
-                            f.write(
-                                "gate ecr q0,q1 { rzx(pi/4) q0,q1; x q0; rzx(-pi/4) q0,q1; }\n"
-                            )
-
-                print("New qasm file for: ", filepath)
-
-            elif comp_path_index >= 28 and comp_path_index <= 29:
-                with open(filepath) as f:
-                    lines = f.readlines()
-                with open(filepath, "w") as f:
-                    for count, line in enumerate(lines):
-                        f.write(line)
-                        if count == 9:
-                            f.write(
-                                "gate rzx(param0) q0,q1 { h q1; cx q0,q1; rz(param0) q1; cx q0,q1; h q1; }\n"
-                            )
-                            f.write(
-                                "gate ecr q0,q1 { rzx(pi/4) q0,q1; x q0; rzx(-pi/4) q0,q1; }\n"
-                            )
-                print("New qasm file for: ", filepath)
-
-
-def save_classifier(clf):
-    dump(clf, "trained_clf.joblib")
-
-
-def save_training_data(res):
-    training_data, names_list, scores_list = res
-
-    with resources.as_file(resources.files("mqt.predictor") / "training_data") as path:
-        data = np.asarray(training_data)
-        np.save(str(path / "training_data.npy"), data)
-        data = np.asarray(names_list)
-        np.save(str(path / "names_list.npy"), data)
-        data = np.asarray(scores_list)
-        np.save(str(path / "scores_list.npy"), data)
-
-
-def load_training_data():
-    with resources.as_file(resources.files("mqt.predictor") / "training_data") as path:
-        if (
-            path.joinpath("training_data.npy").is_file()
-            and path.joinpath("names_list.npy").is_file()
-            and path.joinpath("scores_list.npy").is_file()
-        ):
-            training_data = np.load(str(path / "training_data.npy"), allow_pickle=True)
-            names_list = list(np.load(str(path / "names_list.npy"), allow_pickle=True))
-            scores_list = list(
-                np.load(str(path / "scores_list.npy"), allow_pickle=True)
+    for compiled_circuits in get_compiled_circuit_index(directory).values():
+        for comp_path_index, filepath in compiled_circuits:
+            postprocess_qasm_file(filepath, comp_path_index)
+
+
+def save_classifier(clf, feature_schema: FeatureSchema, path: str = None):
+    """Saves a trained classifier together with its feature schema as model bundle, by default within the
+    package. The bundle is written to a temporary file that replaces the previous bundle atomically, since other
+    processes may have memory-mapped the previous one."""
+    with resources.as_file(
+        get_model_bundle_path() if path is None else Path(path)
+    ) as path:
+        tmp_path = path.with_name(path.name + ".tmp")
+        dump(build_model_bundle(clf, feature_schema), str(tmp_path))
+        os.replace(tmp_path, path)
+
+
+def get_model_bundle_version():
+    """Returns the version of the model bundle format. It must be increased whenever the format changes."""
+    model_bundle_version = 1
+    return model_bundle_version
+
+
+def get_model_bundle_path():
+    return resources.files("mqt.predictor") / "trained_model.joblib"
+
+
+@dataclass
+class ModelBundle:
+    """Everything a trained classifier depends on, saved and loaded as a single versioned artifact.
+
+    clf -- trained classifier
+    feature_schema -- feature schema of the classifier
+    comp_path_LUT -- compilation paths the classifier predicts, see get_index_to_comppath_LUT()
+    calibration_versions -- version of the calibration of each device the training data is based on
+    feature_schema_version -- version of the features the classifier was trained on
+    bundle_version -- version of the model bundle format
+    """
+
+    clf: object
+    feature_schema: FeatureSchema
+    comp_path_LUT: dict
+    calibration_versions: dict
+    feature_schema_version: int
+    bundle_version: int
+
+    def get_outdated_devices(self):
+        """Returns the names of all devices whose calibration changed since the training data of the classifier was
+        scored. The device calibrations are built if they are not yet available."""
+        return [
+            device
+            for device, version in get_calibration_versions().items()
+            if self.calibration_versions.get(device) != version
+        ]
+
+
+def build_model_bundle(clf, feature_schema: FeatureSchema):
+    """Returns the ModelBundle of a trained classifier and its feature schema for the current compilation paths and
+    device calibrations."""
+    return ModelBundle(
+        clf,
+        feature_schema,
+        get_index_to_comppath_LUT(),
+        get_calibration_versions(),
+        feature_schema.schema_version,
+        get_model_bundle_version(),
+    )
+
+
+def load_model_bundle(path: str = None, mmap_mode: str = "r"):
+    """Returns the saved ModelBundle, by default from within the package, and None if it does not exist or does not
+    fit the current compilation paths and features.
+
+    By default, the arrays of the bundle are memory-mapped read-only instead of being read into memory.
+    """
+    with resources.as_file(
+        get_model_bundle_path() if path is None else Path(path)
+    ) as path:
+        if not path.is_file():
+            return None
+        model_bundle = load(str(path), mmap_mode=mmap_mode)
+
+    if (
+        not isinstance(model_bundle, ModelBundle)
+        or model_bundle.bundle_version != get_model_bundle_version()
+    ):
+        print("Model bundle version is not supported.")
+        return None
+    if model_bundle.comp_path_LUT != get_index_to_comppath_LUT():
+        print("Model bundle was trained for other compilation paths.")
+        return None
+    if model_bundle.feature_schema_version != get_feature_schema_version():
+        print("Model bundle was trained on another feature schema version.")
+        return None
+
+    # Building the calibrations only for this check would dominate the loading time, so the calibrations are only
+    # compared if they are already built, otherwise see ModelBundle.get_outdated_devices
+    if device_calibrations:
+        outdated_devices = model_bundle.get_outdated_devices()
+        if outdated_devices:
+            print(
+                "Model bundle was trained on outdated calibrations of: ",
+                outdated_devices,
             )
-        else:
-            print("Training data loading failed.")
-            return
 
-        return training_data, names_list, scores_list
+    return model_bundle
+
+
+def get_feature_names():
+    """Returns the names of all features created by create_feature_dict in their order within the feature vector."""
+    feature_names = get_openqasm_gates() + [
+        "num_qubits",
+        "depth",
+        "program_communication",
+        "critical_depth",
+        "entanglement_ratio",
+        "parallelism",
+        "liveness",
+    ]
+    return feature_names
+
+
+@dataclass(frozen=True)
+class FeatureSchema:
+    """Features used by a classifier: the names of all features and the mask of those features that are used.
+
+    feature_names -- names of all features in the order of the complete feature vector
+    mask -- boolean mask of the used features
+    schema_version -- version of the features, see get_feature_schema_version()
+    """
+
+    feature_names: tuple
+    mask: np.ndarray
+    schema_version: int
+
+    def __post_init__(self):
+        self.mask.setflags(write=False)
+
+    @cached_property
+    def indices(self):
+        """Indices of the used features within the complete feature vector."""
+        return np.flatnonzero(self.mask)
+
+    @property
+    def used_feature_names(self):
+        return [self.feature_names[i] for i in self.indices]
+
+    def apply(self, feature_matrix: np.ndarray):
+        """Returns the columns of the used features of a matrix of complete feature vectors (one row per circuit)."""
+        return np.asarray(feature_matrix)[:, self.indices]
+
+
+def build_feature_schema(feature_matrix: np.ndarray):
+    """Returns the FeatureSchema using all features that are non-zero for at least one row of a matrix of complete
+    feature vectors."""
+    feature_names = tuple(get_feature_names())
+    feature_matrix = np.asarray(feature_matrix)
+    assert feature_matrix.shape[1] == len(feature_names)
+    return FeatureSchema(
+        feature_names,
+        np.any(feature_matrix != 0, axis=0),
+        get_feature_schema_version(),
+    )
+
+
+@dataclass(frozen=True)
+class TrainingData:
+    """Columnar training data with one row per training sample.
+
+    features -- float32 matrix of all feature vectors
+    labels -- int64 vector of the indices of the best compilation paths
+    scores -- float64 matrix of the evaluation scores of all compilation paths
+    names -- fixed-width byte strings of the circuit names
+    """
+
+    features: np.ndarray
+    labels: np.ndarray
+    scores: np.ndarray
+    names: np.ndarray
+
+    def __len__(self):
+        return len(self.labels)
+
+
+def get_training_data_columns(num_features: int, num_comp_paths: int):
+    """Returns the dtype and row shape of all columns of the training data store. All numbers are stored
+    little-endian."""
+    return {
+        "features": ("<f4", (num_features,)),
+        "labels": ("<i8", ()),
+        "scores": ("<f8", (num_comp_paths,)),
+        "names": ("S128", ()),
+    }
+
+
+def get_training_data_path():
+    return resources.files("mqt.predictor") / "training_data"
+
+
+def training_data_to_columns(res):
+    """Converts the training data as returned by generate_trainingdata_from_qasm_files into its columns. Returns None
+    if it is malformed, e.g., if its generation failed."""
+    try:
+        training_data, names_list, scores_list = res
+        num_samples = len(training_data)
+        features = np.asarray(
+            [training_sample[0] for training_sample in training_data],
+            dtype=np.float32,
+        ).reshape(num_samples, len(get_feature_names()))
+        labels = np.asarray(
+            [training_sample[1] for training_sample in training_data], dtype=np.int64
+        )
+        scores = np.asarray(scores_list, dtype=np.float64).reshape(
+            num_samples, len(get_index_to_comppath_LUT())
+        )
+        names = np.asarray(names_list, dtype="S128").reshape(num_samples)
+    except (TypeError, ValueError) as e:
+        print("Training data is malformed: ", e)
+        return None
+    if any(len(name) > 128 for name in names_list):
+        print("Training data is malformed: circuit names exceed 128 characters.")
+        return None
+    return {"features": features, "labels": labels, "scores": scores, "names": names}
+
+
+def append_to_column_file(path: Path, array: np.ndarray, dtype: str, offset: int):
+    """Appends an array to a raw binary column file after dropping everything behind the first offset elements,
+    e.g., elements of an interrupted previous append that are not covered by the meta data."""
+    with open(path, "ab") as f:
+        f.truncate(offset * np.dtype(dtype).itemsize)
+        f.write(np.ascontiguousarray(array, dtype=dtype).tobytes())
+
+
+def write_column_store_meta(path: Path, meta: dict):
+    """Replaces the meta data file of a columnar store atomically."""
+    tmp_path = path / "meta.json.tmp"
+    tmp_path.write_text(json.dumps(meta, indent=2))
+    os.replace(tmp_path, path / "meta.json")
+
+
+def save_training_data(res, path: str = None):
+    """Saves the training data as returned by generate_trainingdata_from_qasm_files in the columnar training data
+    store, replacing all previously stored training data. The store is written to a temporary directory first that
+    replaces the previous store only after it is complete, so the previous training data is kept if anything fails.
+
+    Each column is stored as a raw binary file of fixed-size rows described by "meta.json", which allows to memory-map
+    and append to it without any pickling.
+
+    Return values:
+    True -- saving succeeded
+    False -- if the training data is malformed
+    """
+    columns = training_data_to_columns(res)
+    if columns is None:
+        return False
+
+    with resources.as_file(
+        get_training_data_path() if path is None else Path(path)
+    ) as path:
+        tmp_path = path.with_name(path.name + ".tmp")
+        old_path = path.with_name(path.name + ".old")
+        for directory in [tmp_path, old_path]:
+            if directory.exists():
+                shutil.rmtree(directory)
+        if not append_training_data_columns(columns, tmp_path):
+            return False
+
+        if path.exists():
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        if old_path.exists():
+            shutil.rmtree(old_path)
+        return True
+
+
+def append_training_data(res, path: str = None):
+    """Appends the training data as returned by generate_trainingdata_from_qasm_files to the columnar training data
+    store.
+
+    Return values:
+    True -- appending succeeded
+    False -- if the training data is malformed or does not match the stored training data
+    """
+    columns = training_data_to_columns(res)
+    if columns is None:
+        return False
+    with resources.as_file(
+        get_training_data_path() if path is None else Path(path)
+    ) as path:
+        return append_training_data_columns(columns, path)
+
+
+def append_training_data_columns(columns: dict, path: Path):
+    """Appends the columns of training data (see training_data_to_columns) to the columnar training data store in
+    path."""
+    num_samples = len(columns["labels"])
+    path.mkdir(parents=True, exist_ok=True)
+    meta_path = path / "meta.json"
+    if meta_path.is_file():
+        meta = json.loads(meta_path.read_text())
+    else:
+        meta = {
+            "num_samples": 0,
+            "num_features": columns["features"].shape[1],
+            "num_comp_paths": columns["scores"].shape[1],
+            "feature_schema_version": get_feature_schema_version(),
+            "calibration_versions": get_calibration_versions(),
+        }
+
+    if num_samples > 0 and (
+        columns["features"].shape[1] != meta["num_features"]
+        or columns["scores"].shape[1] != meta["num_comp_paths"]
+    ):
+        print("Training data does not match the stored training data.")
+        return False
+
+    dtypes = get_training_data_columns(meta["num_features"], meta["num_comp_paths"])
+    meta["columns"] = {column: dtype for column, (dtype, _) in dtypes.items()}
+    for column, (dtype, row_shape) in dtypes.items():
+        append_to_column_file(
+            path / (column + ".bin"),
+            columns[column],
+            dtype,
+            meta["num_samples"] * int(np.prod(row_shape)),
+        )
+    meta["num_samples"] += num_samples
+    write_column_store_meta(path, meta)
+    return True
+
+
+def load_training_data_meta(path: str = None):
+    """Returns the meta data of the stored training data, e.g., the versions of the device calibrations its scores
+    are based on, and None if no training data is stored."""
+    with resources.as_file(
+        get_training_data_path() if path is None else Path(path)
+    ) as path:
+        if not path.joinpath("meta.json").is_file():
+            return None
+        return json.loads(path.joinpath("meta.json").read_text())
+
+
+def update_training_data_scores(
+    scores: np.ndarray, path: str = None, devices: list = None
+):
+    """Overwrites the scores of all stored training samples in place, updates their labels accordingly and records
+    the device calibrations in use (see get_device_calibrations) of the given devices, all devices if not provided,
+    as the ones the scores are based on."""
+    meta = load_training_data_meta(path)
+    if meta is None or scores.shape != (meta["num_samples"], meta["num_comp_paths"]):
+        print("Scores do not match the stored training data.")
+        return False
+
+    with resources.as_file(
+        get_training_data_path() if path is None else Path(path)
+    ) as path:
+        if meta["num_samples"] > 0:
+            dtypes = get_training_data_columns(
+                meta["num_features"], meta["num_comp_paths"]
+            )
+            stored_scores = np.memmap(
+                path / "scores.bin",
+                dtype=dtypes["scores"][0],
+                mode="r+",
+                shape=scores.shape,
+            )
+            stored_scores[:] = scores
+            stored_scores.flush()
+            stored_labels = np.memmap(
+                path / "labels.bin",
+                dtype=dtypes["labels"][0],
+                mode="r+",
+                shape=(meta["num_samples"],),
+            )
+            stored_labels[:] = np.argmax(scores, axis=1)
+            stored_labels.flush()
+        calibration_versions = get_calibration_versions()
+        if devices is not None:
+            calibration_versions = {
+                **meta.get("calibration_versions", {}),
+                **{device: calibration_versions[device] for device in devices},
+            }
+        meta["calibration_versions"] = calibration_versions
+        write_column_store_meta(path, meta)
+        return True
+
+
+def load_training_data(path: str = None):
+    """Returns the stored training data as TrainingData whose columns are read-only memory maps and None if no
+    training data is stored."""
+    with resources.as_file(
+        get_training_data_path() if path is None else Path(path)
+    ) as path:
+        if not path.joinpath("meta.json").is_file():
+            print("Training data loading failed.")
+            return None
+
+        meta = json.loads(path.joinpath("meta.json").read_text())
+        num_samples = meta["num_samples"]
+        columns = {}
+        for column, (dtype, row_shape) in get_training_data_columns(
+            meta["num_features"], meta["num_comp_paths"]
+        ).items():
+            shape = (num_samples, *row_shape)
+            if num_samples == 0:
+                columns[column] = np.empty(shape, dtype=dtype)
+            else:
+                columns[column] = np.memmap(
+                    path / (column + ".bin"), dtype=dtype, mode="r", shape=shape
+                )
+
+        return TrainingData(**columns)
@@ -0,0 +1,168 @@
+import itertools
+from pathlib import Path
+
+import numpy as np
+from mqt.bench import benchmark_generator
+
+from mqt.predictor import cache, utils
+
+
+def test_get_qasm_hash():
+    qasm_str = benchmark_generator.get_one_benchmark("ghz", 1, 3).qasm()
+    reformatted = "// comment\n" + qasm_str.replace("\n", "  \r\n")
+    assert cache.get_qasm_hash(qasm_str) == cache.get_qasm_hash(reformatted)
+    other_qasm_str = benchmark_generator.get_one_benchmark("ghz", 1, 4).qasm()
+    assert cache.get_qasm_hash(qasm_str) != cache.get_qasm_hash(other_qasm_str)
+
+
+def test_feature_cache():
+    db_path = Path("test_feature_cache.sqlite")
+    qasm_strs = [
+        benchmark_generator.get_one_benchmark("dj", 1, num_qubits).qasm()
+        for num_qubits in range(3, 6)
+    ]
+
+    feature_cache = cache.FeatureCache(str(db_path), max_memory_entries=2)
+    expected = list(utils.create_feature_dicts(qasm_strs, n_jobs=1))
+    assert (
+        list(
+            utils.create_feature_dicts(qasm_strs, n_jobs=1, feature_cache=feature_cache)
+        )
+        == expected
+    )
+    assert len(feature_cache.memory) == 2
+    assert len(feature_cache) == 3
+    feature_cache.close()
+
+    # features are served from disk without parsing the circuits again
+    feature_cache = cache.FeatureCache(str(db_path))
+    keys = [feature_cache.get_key(qasm_str) for qasm_str in qasm_strs]
+    assert [feature_cache.get(key) for key in keys] == expected
+    feature_cache.close()
+
+    # a new feature schema version invalidates all cached features
+    feature_cache = cache.FeatureCache(
+        str(db_path), schema_version=utils.get_feature_schema_version() + 1
+    )
+    assert len(feature_cache) == 0
+    assert feature_cache.get(keys[0]) is None
+    feature_cache.close()
+    db_path.unlink()
+
+
+def test_feature_cache_hits_are_streamed():
+    qasm_str = benchmark_generator.get_one_benchmark("ghz", 1, 3).qasm()
+    feature_cache = cache.FeatureCache()
+    expected = utils.create_feature_dict(qasm_str)
+    feature_cache.put(feature_cache.get_key(qasm_str), expected)
+
+    # cached circuits are yielded right away, even from an endless stream
+    feature_dicts = utils.create_feature_dicts(
+        itertools.repeat(qasm_str), n_jobs=1, feature_cache=feature_cache
+    )
+    assert next(feature_dicts) == expected
+    assert next(feature_dicts) == expected
+    feature_dicts.close()
+
+
+def test_feature_cache_size_eviction():
+    feature_cache = cache.FeatureCache(":memory:", max_disk_bytes=100)
+    for i in range(10):
+        feature_cache.put(str(i), {"depth": i, "padding": "x" * 20})
+    assert len(feature_cache) < 10
+    assert (
+        feature_cache.connection.execute("SELECT SUM(size) FROM features").fetchone()[0]
+        <= 100
+    )
+    feature_cache.close()
+
+
+def test_compiled_circuit_store():
+    directory = Path("test_compiled_circuit_store")
+    store = cache.CompiledCircuitStore(str(directory))
+    circuit_hash = cache.get_qasm_hash(
+        benchmark_generator.get_one_benchmark("ghz", 1, 3).qasm()
+    )
+    assert store.get(circuit_hash, 0) is None
+    store.put(circuit_hash, 0, "compiled")
+    assert store.get(circuit_hash, 0) == "compiled"
+    assert store.get(circuit_hash, 1) is None
+    assert [path.suffix for path in directory.iterdir()] == [".qasm"]
+
+    for path in directory.iterdir():
+        path.unlink()
+    directory.rmdir()
+
+
+def test_compilation_manifest():
+    db_path = Path("test_manifest.sqlite")
+    output_path = Path("test_manifest_output.qasm")
+    output_path.write_text("compiled")
+    output_hash = cache.get_file_hash(output_path)
+    manifest = cache.CompilationManifest(str(db_path))
+    manifest.record("a.qasm", 0, "success", 1.0, 10, "hash_a", output_hash)
+    manifest.record("a.qasm", 1, "timeout", 10.0, 10, "hash_a")
+    manifest.record("a.qasm", 2, "failure", 0.1, 10, "hash_a")
+    assert len(manifest) == 3
+    manifest.close()
+
+    manifest = cache.CompilationManifest(str(db_path))
+    entries = manifest.get_all()
+    assert len(entries) == 3
+    assert manifest.get("a.qasm", 0) == entries[("a.qasm", 0)]
+    assert entries[("a.qasm", 0)]["output_hash"] == output_hash
+    assert manifest.get("b.qasm", 0) is None
+
+    assert manifest.needs_compilation(None, "hash_a", output_path, 10)
+    assert not manifest.needs_compilation(
+        entries[("a.qasm", 0)], "hash_a", output_path, 10
+    )
+    assert manifest.needs_compilation(entries[("a.qasm", 0)], "other", output_path, 10)
+    # a compiled circuit that has been changed or removed is compiled again
+    output_path.write_text("compi")
+    assert manifest.needs_compilation(entries[("a.qasm", 0)], "hash_a", output_path, 10)
+    output_path.unlink()
+    assert manifest.needs_compilation(entries[("a.qasm", 0)], "hash_a", output_path, 10)
+
+    assert not manifest.needs_compilation(
+        entries[("a.qasm", 1)], "hash_a", output_path, 10
+    )
+    assert manifest.needs_compilation(entries[("a.qasm", 1)], "hash_a", output_path, 60)
+    assert not manifest.needs_compilation(
+        entries[("a.qasm", 2)], "hash_a", output_path, 60
+    )
+
+    manifest.close()
+    db_path.unlink()
+
+
+def test_gate_array_store():
+    directory = Path("test_gate_arrays")
+    store = cache.GateArrayStore(str(directory))
+    assert store.get_file_hashes() == {}
+    gate_arrays = [
+        (np.array([0, 1]), np.array([0, 1]), np.array([-1, -1])),
+        (np.array([2]), np.array([0]), np.array([1])),
+    ]
+    store.append(
+        [("a", 0, "hash_a", gate_arrays[0]), ("b", 1, "hash_b", gate_arrays[1])]
+    )
+    # circuits that are stored again replace their previous entry
+    store.append([("a", 0, "hash_a_new", gate_arrays[1])])
+    assert store.get_file_hashes() == {("a", 0): "hash_a_new", ("b", 1): "hash_b"}
+
+    columns = store.load()
+    assert list(columns["offsets"]) == [0, 2, 3, 4]
+    assert columns["latest"] == {("a", 0): 2, ("b", 1): 1}
+    gate_ids, first_qubits, second_qubits, offsets = store.get_gate_arrays(
+        columns, [0, 2]
+    )
+    assert list(gate_ids) == [0, 1, 2]
+    assert list(first_qubits) == [0, 1, 0]
+    assert list(second_qubits) == [-1, -1, 1]
+    assert list(offsets) == [0, 2, 3]
+    del columns
+
+    for path in directory.iterdir():
+        path.unlink()
+    directory.rmdir()
@@ -1,24 +1,20 @@
-import sys
+import json
 from pathlib import Path
 from unittest.mock import patch
 
+import numpy as np
 import pytest
-
-if sys.version_info < (3, 10, 0):
-    import importlib_resources as resources
-else:
-    from importlib import resources
-
 from mqt.bench import benchmark_generator
+from qiskit import QuantumCircuit
+from sklearn.ensemble import RandomForestClassifier
 
-from mqt.predictor import utils
+from mqt.predictor import cache, utils
 from mqt.predictor.driver import Predictor
 
 
 @patch("matplotlib.pyplot.show")
 def test_predict(mock_show):
-    path = resources.files("mqt.predictor") / "trained_clf.joblib"
-    assert path.is_file()
+    assert utils.get_model_bundle_path().is_file()
     filename = "test_qasm.qasm"
     qc = benchmark_generator.get_one_benchmark("dj", 1, 8)
     qc.qasm(filename=filename)
@@ -27,6 +23,8 @@ def test_predict(mock_show):
     assert prediction >= 0 and prediction < len(utils.get_index_to_comppath_LUT())
     prediction = predictor.predict(qc.qasm())
     assert prediction >= 0 and prediction < len(utils.get_index_to_comppath_LUT())
+    prediction = predictor.predict(qc)
+    assert prediction >= 0 and prediction < len(utils.get_index_to_comppath_LUT())
     prediction = predictor.predict("fail test")
     assert not prediction
 
@@ -36,6 +34,16 @@ def test_predict(mock_show):
     assert prediction >= 0 and prediction < len(utils.get_index_to_comppath_LUT())
 
 
+def test_predict_batch():
+    qc = benchmark_generator.get_one_benchmark("ghz", 1, 5)
+    predictor = Predictor()
+    predictions, failed = predictor.predict_batch([qc.qasm(), "fail test", qc.qasm()])
+    assert list(failed) == [False, True, False]
+    assert predictions[1] == -1
+    assert predictions[0] == predictions[2] == predictor.predict(qc.qasm())
+    assert 0 <= predictions[0] < len(utils.get_index_to_comppath_LUT())
+
+
 @pytest.mark.parametrize(
     "comp_path", list(range(len(utils.get_index_to_comppath_LUT())))
 )
@@ -53,6 +61,22 @@ def test_compilation_paths(comp_path):
         Path(tmp_filename).unlink()
 
 
+def test_compile_predicted_compilation_path_with_store():
+    store_directory = Path("test_compiled_store")
+    predictor = Predictor(
+        compiled_circuit_store=cache.CompiledCircuitStore(str(store_directory))
+    )
+    qc_qasm = benchmark_generator.get_one_benchmark("dj", 1, 3).qasm()
+    res = predictor.compile_predicted_compilation_path(qc_qasm, 0)
+    assert res
+    assert len(list(store_directory.iterdir())) == 1
+    assert predictor.compile_predicted_compilation_path(qc_qasm, 0) == res
+
+    for path in store_directory.iterdir():
+        path.unlink()
+    store_directory.rmdir()
+
+
 def test_compile_all_circuits_for_qc():
     qc = benchmark_generator.get_one_benchmark("dj", 1, 2)
     tmp_filename = "test.qasm"
@@ -71,10 +95,31 @@ def test_train_random_forest_classifier(mock_pyplot):
     predictor = Predictor()
     assert predictor.clf is None
     predictor.train_random_forest_classifier(visualize_results=True)
-    if Path("non_zero_indices.npy").exists():
-        Path("non_zero_indices.npy").unlink()
-
     assert predictor.clf is not None
+    assert predictor.feature_schema is not None
+    search_results_path = Path("results/hyperparameter_search.json")
+    assert search_results_path.exists()
+    search_results_path.unlink()
+
+
+def test_search_hyperparameters():
+    predictor = Predictor()
+    training_data = utils.load_training_data()
+    X = training_data.features[:300]
+    y = training_data.labels[:300]
+
+    clf, search_results = predictor.search_hyperparameters(
+        X, y, search_mode="random", time_budget=0, n_jobs=2
+    )
+    assert len(search_results["candidates"]) == 2
+    assert clf.get_params()["n_estimators"] == (
+        search_results["best_params"]["n_estimators"]
+    )
+    assert max(
+        candidate["mean_test_score"] for candidate in search_results["candidates"]
+    ) == pytest.approx(search_results["best_score"])
+
+    assert predictor.search_hyperparameters(X, y, search_mode="unknown") is None
 
 
 def test_generate_compiled_circuits():
@@ -89,7 +134,6 @@ def test_generate_compiled_circuits():
     qasm_path = Path("compiled_test.qasm")
     qc.qasm(filename=str(qasm_path))
     predictor.generate_compiled_circuits(source_path, str(target_path))
-    utils.postprocess_ocr_qasm_files(str(target_path))
 
     training_sample, circuit_name, scores = predictor.generate_training_sample(
         str(qasm_path), source_path, target_path
@@ -107,6 +151,27 @@ def test_generate_compiled_circuits():
     assert name_list
     assert scores_list
 
+    # a rerun only compiles the missing compiled circuit again
+    manifest_path = target_path / "compilation_manifest.sqlite"
+    manifest = cache.CompilationManifest(str(manifest_path))
+    recorded_results = manifest.get_all()
+    manifest.close()
+    assert ("compiled_test.qasm", 0) in recorded_results
+    (target_path / "compiled_test_0.qasm").unlink()
+    predictor.generate_compiled_circuits(source_path, str(target_path))
+    assert (target_path / "compiled_test_0.qasm").exists()
+    manifest = cache.CompilationManifest(str(manifest_path))
+    rerun_results = manifest.get_all()
+    manifest.close()
+    assert (
+        rerun_results[("compiled_test.qasm", 0)]
+        != recorded_results[("compiled_test.qasm", 0)]
+    )
+    assert (
+        rerun_results[("compiled_test.qasm", 1)]
+        == recorded_results[("compiled_test.qasm", 1)]
+    )
+
     if target_path.exists():
         for file in target_path.iterdir():
             file.unlink()
@@ -114,3 +179,194 @@ def test_generate_compiled_circuits():
 
     if qasm_path.exists():
         qasm_path.unlink()
+
+
+def test_predict_feasible_comp_paths():
+    training_data = utils.load_training_data()
+    X = np.array(training_data.features[:300])
+    y = np.array(training_data.labels[:300])
+    feature_schema = utils.build_feature_schema(X)
+    clf = RandomForestClassifier(n_estimators=5, random_state=0).fit(
+        feature_schema.apply(X), y
+    )
+    predictor = Predictor()
+    predictor.set_classifier(clf, feature_schema)
+
+    max_qubits = utils.get_comp_path_max_qubits()
+    num_qubits_index = utils.get_feature_names().index("num_qubits")
+    for num_qubits in [9, 12, 28, 100]:
+        X[:, num_qubits_index] = num_qubits
+        predictions = predictor.predict_feature_matrix(X)
+        assert np.all(max_qubits[predictions] >= num_qubits)
+
+    X[:, num_qubits_index] = max(max_qubits) + 1
+    assert np.all(predictor.predict_feature_matrix(X) == -1)
+
+
+def test_predict_ranked():
+    qcs = [
+        benchmark_generator.get_one_benchmark("ghz", 1, 5),
+        benchmark_generator.get_one_benchmark("dj", 1, 9),
+    ]
+    predictor = Predictor()
+    k = len(utils.get_index_to_comppath_LUT()) + 1
+    predictions, probabilities, failed = predictor.predict_ranked_batch(
+        [qcs[0].qasm(), "fail test", qcs[1].qasm()], k
+    )
+    assert predictions.shape == probabilities.shape == (3, k)
+    assert list(failed) == [False, True, False]
+    assert np.all(predictions[1] == -1)
+    assert np.all(probabilities[1] == 0)
+    assert np.all(np.diff(probabilities, axis=1) <= 0)
+    assert np.all(predictions[:, -1] == -1)
+
+    max_qubits = utils.get_comp_path_max_qubits()
+    for i, qc in [(0, qcs[0]), (2, qcs[1])]:
+        ranked = predictions[i][predictions[i] >= 0]
+        assert len(set(ranked)) == len(ranked)
+        assert np.all(max_qubits[ranked] >= qc.num_qubits)
+        assert ranked[0] == predictor.predict(qc.qasm())
+        top_predictions, top_probabilities = predictor.predict_ranked(qc.qasm(), 2)
+        assert list(top_predictions) == list(predictions[i, :2])
+        assert np.allclose(top_probabilities, probabilities[i, :2])
+
+    assert predictor.predict_ranked("fail test") is None
+    with pytest.raises(ValueError):
+        predictor.predict_ranked(qcs[0].qasm(), 0)
+
+
+def test_predict_and_compile():
+    qc = benchmark_generator.get_one_benchmark("ghz", 1, 5)
+    predictor = Predictor()
+    prediction, compiled_qasm = predictor.predict_and_compile(qc.qasm())
+    assert prediction == predictor.predict(qc.qasm())
+    assert compiled_qasm == predictor.compile_predicted_compilation_path(
+        qc.qasm(), prediction
+    )
+    assert predictor.predict_and_compile("fail test") is None
+
+
+def test_compile_best_of_k():
+    qc = benchmark_generator.get_one_benchmark("ghz", 1, 5)
+    predictor = Predictor()
+    candidates, _probabilities = predictor.predict_ranked(qc.qasm(), 3)
+    prediction, compiled_qasm, score = predictor.compile_best_of_k(qc.qasm(), 3)
+    assert prediction in candidates
+    device = utils.get_index_to_comppath_LUT()[prediction][1]
+    compiled_qc = QuantumCircuit.from_qasm_str(compiled_qasm)
+    assert score == utils.calc_eval_score_for_qc(compiled_qc, device)
+    assert 0 < score <= 1
+
+    # compilations exceeding the deadline are aborted
+    assert predictor.compile_best_of_k(qc.qasm(), 3, deadline=0) is None
+    assert predictor.compile_best_of_k("fail test") is None
+
+
+def test_compile_circuit_for_comp_path():
+    qc = benchmark_generator.get_one_benchmark("dj", 1, 9)
+    tmp_filename = "test_comp_path.qasm"
+    qc.qasm(filename=tmp_filename)
+    target_path = Path("test_comp_path_compiled")
+    target_path.mkdir(exist_ok=True)
+    predictor = Predictor()
+
+    tasks = predictor.get_compilation_tasks([tmp_filename], ".")
+    oqc_comp_path_ids = [
+        comp_path_id
+        for comp_path_id, comp_path in utils.get_index_to_comppath_LUT().items()
+        if comp_path[1] == "oqc_lucy"
+    ]
+    assert len(tasks) == len(utils.get_index_to_comppath_LUT()) - len(oqc_comp_path_ids)
+    assert all(comp_path_id not in oqc_comp_path_ids for _, comp_path_id in tasks)
+
+    assert not predictor.compile_circuit_for_comp_path(
+        tmp_filename, oqc_comp_path_ids[0], ".", str(target_path)
+    )
+    assert predictor.compile_circuit_for_comp_path(
+        tmp_filename, 0, ".", str(target_path)
+    )
+    assert (target_path / "test_comp_path_0.qasm").exists()
+
+    for file in target_path.iterdir():
+        file.unlink()
+    target_path.rmdir()
+    Path(tmp_filename).unlink()
+
+
+def test_incremental_retraining():
+    source_path = Path("test_incremental_source")
+    target_path = Path("test_incremental_compiled")
+    training_data_path = Path("test_incremental_training_data")
+    source_path.mkdir(exist_ok=True)
+    target_path.mkdir(exist_ok=True)
+    benchmark_generator.get_one_benchmark("dj", 1, 3).qasm(
+        filename=str(source_path / "dj_3.qasm")
+    )
+    predictor = Predictor()
+    predictor.generate_compiled_circuits(str(source_path), str(target_path))
+
+    assert (
+        predictor.add_new_training_samples(
+            str(source_path), str(target_path), str(training_data_path)
+        )
+        == 1
+    )
+    assert (
+        predictor.add_new_training_samples(
+            str(source_path), str(target_path), str(training_data_path)
+        )
+        == 0
+    )
+
+    assert predictor.update_gate_array_store(str(target_path)) > 0
+    assert predictor.update_gate_array_store(str(target_path)) == 0
+    assert (
+        predictor.rescore_training_data(str(target_path), str(training_data_path)) == 0
+    )
+    scores = np.array(utils.load_training_data(str(training_data_path)).scores)
+    meta = utils.load_training_data_meta(str(training_data_path))
+    meta["calibration_versions"] = {}
+    (training_data_path / "meta.json").write_text(json.dumps(meta))
+    # rescoring only reads the gate array store
+    for path in target_path.glob("*.qasm"):
+        path.unlink()
+    assert (
+        predictor.rescore_training_data(str(target_path), str(training_data_path)) == 1
+    )
+    training_data = utils.load_training_data(str(training_data_path))
+    assert np.allclose(training_data.scores, scores)
+    # only the calibrations of devices with stored compiled circuits are recorded as up to date
+    stored_devices = {
+        utils.get_index_to_comppath_LUT()[comp_path_index][1]
+        for _name, comp_path_index in cache.GateArrayStore(
+            str(target_path / "gate_arrays")
+        ).get_file_hashes()
+    }
+    recorded_versions = utils.load_training_data_meta(str(training_data_path))[
+        "calibration_versions"
+    ]
+    assert set(recorded_versions) == stored_devices
+
+    feature_schema = utils.build_feature_schema(training_data.features)
+    clf = RandomForestClassifier(n_estimators=2, random_state=0).fit(
+        feature_schema.apply(training_data.features), training_data.labels
+    )
+    predictor.set_classifier(clf, feature_schema)
+    assert predictor.retrain_random_forest_classifier(
+        n_additional_estimators=3, training_data_path=str(training_data_path)
+    )
+    assert len(predictor.clf.estimators_) == 5
+    assert not predictor.retrain_random_forest_classifier(
+        training_data_path="test_missing_training_data"
+    )
+    del training_data
+
+    for path in [
+        source_path,
+        target_path / "gate_arrays",
+        target_path,
+        training_data_path,
+    ]:
+        for file in path.iterdir():
+            file.unlink()
+        path.rmdir()
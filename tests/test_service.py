@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+from mqt.bench import benchmark_generator
+
+from mqt.predictor import service
+from mqt.predictor.driver import Predictor
+
+
+def test_async_predictor():
+    qasm_strs = [
+        benchmark_generator.get_one_benchmark("ghz", 1, num_qubits).qasm()
+        for num_qubits in range(3, 8)
+    ]
+    predictor = Predictor()
+    expected, _failed = predictor.predict_batch(qasm_strs)
+
+    async def predict_concurrently():
+        async with service.AsyncPredictor(
+            predictor, max_batch_size=4, max_wait=1
+        ) as async_predictor:
+            predictions = await asyncio.gather(
+                *[async_predictor.predict(qasm_str) for qasm_str in qasm_strs],
+                async_predictor.predict("fail test"),
+            )
+            ranked = await async_predictor.predict_ranked(qasm_strs[0], 2)
+            return (
+                predictions,
+                ranked,
+                list(async_predictor.batch_sizes),
+                async_predictor.num_requests,
+            )
+
+    predictions, ranked, batch_sizes, num_requests = asyncio.run(predict_concurrently())
+    assert predictions[:-1] == list(expected)
+    assert predictions[-1] is None
+    assert batch_sizes == [4, 2, 1]
+    assert num_requests == 7
+    assert ranked[0][0] == expected[0]
+    assert len(ranked[1]) == 2
+
+
+def test_stop_during_batch():
+    qasm_str = benchmark_generator.get_one_benchmark("ghz", 1, 5).qasm()
+    predictor = Predictor()
+
+    async def stop_while_predicting():
+        async_predictor = service.AsyncPredictor(predictor, max_wait=0)
+        await async_predictor.start()
+        request = asyncio.ensure_future(async_predictor.predict(qasm_str))
+        while async_predictor.num_batches == 0:
+            await asyncio.sleep(0)
+        await async_predictor.stop()
+        return await asyncio.wait_for(
+            asyncio.gather(request, return_exceptions=True), 10
+        )
+
+    (result,) = asyncio.run(stop_while_predicting())
+    assert isinstance(result, asyncio.CancelledError)
+
+
+def test_http_server():
+    qasm_str = benchmark_generator.get_one_benchmark("ghz", 1, 5).qasm()
+    predictor = Predictor()
+
+    async def request(port, body):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            (
+                "POST /predict HTTP/1.1\r\nContent-Length: "
+                + str(len(body))
+                + "\r\nConnection: close\r\n\r\n"
+                + body
+            ).encode()
+        )
+        response = await reader.read()
+        writer.close()
+        status_line, _, response_body = response.decode().partition("\r\n")
+        return status_line, json.loads(response_body.split("\r\n\r\n", 1)[1])
+
+    async def serve_requests():
+        async with service.AsyncPredictor(predictor) as async_predictor:
+            server = await service.start_server(async_predictor, port=0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                responses = await asyncio.gather(
+                    request(port, json.dumps({"qasm": qasm_str, "k": 2})),
+                    request(port, "no json"),
+                    request(port, json.dumps({"qasm": qasm_str, "k": 0})),
+                )
+                # invalid requests do not stop the processing of later ones
+                responses.append(
+                    await asyncio.wait_for(
+                        request(port, json.dumps({"qasm": qasm_str, "k": 1})), 10
+                    )
+                )
+                return responses
+
+    (
+        (status, response),
+        (error_status, _error_response),
+        (invalid_k_status, _invalid_k_response),
+        (later_status, later_response),
+    ) = asyncio.run(serve_requests())
+    assert status == "HTTP/1.1 200 OK"
+    assert response["predictions"][0] == predictor.predict(qasm_str)
+    assert len(response["predictions"]) == len(response["probabilities"]) == 2
+    assert error_status == "HTTP/1.1 400 Bad Request"
+    assert invalid_k_status == "HTTP/1.1 400 Bad Request"
+    assert later_status == "HTTP/1.1 200 OK"
+    assert later_response["predictions"] == response["predictions"][:1]
@@ -1,7 +1,15 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import numpy as np
+import pytest
+from joblib import dump
 from mqt.bench import benchmark_generator
 from mqt.bench.utils import qiskit_helper
+from pytket.extensions.qiskit import qiskit_to_tk
+from qiskit import QuantumCircuit
+from sklearn.ensemble import RandomForestClassifier
 
 from mqt.predictor import utils
 
@@ -62,8 +70,79 @@ def test_get_compilation_pipeline():
     assert utils.get_compilation_pipeline() == expected
 
 
+def test_get_device_max_qubits():
+    assert utils.get_device_max_qubits() == {
+        "ibm_washington": 127,
+        "ibm_montreal": 27,
+        "rigetti_aspen_m1": 80,
+        "ionq11": 11,
+        "oqc_lucy": 8,
+    }
+
+
+def test_get_qasm_size():
+    qc = QuantumCircuit(3)
+    qc.h(0)
+    qc.cx(0, 1)
+    qc.cx(1, 2)
+    tmp_filename = "test_size.qasm"
+    qc.qasm(filename=tmp_filename)
+    num_qubits, num_gates = utils.get_qasm_size(tmp_filename)
+    Path(tmp_filename).unlink()
+    assert num_qubits == 3
+    assert num_gates >= 3
+
+
 def test_load_training_data():
-    assert utils.load_training_data() is not None
+    training_data = utils.load_training_data()
+    assert training_data is not None
+    assert len(training_data) > 0
+    assert training_data.features.shape[0] == len(training_data)
+    assert training_data.scores.shape == (
+        len(training_data),
+        len(utils.get_index_to_comppath_LUT()),
+    )
+
+
+def test_training_data_store():
+    path = Path("test_training_data")
+    num_features = len(utils.get_feature_names())
+    num_comp_paths = len(utils.get_index_to_comppath_LUT())
+    features = np.arange(3 * num_features, dtype=np.float32).reshape(3, num_features)
+    scores = np.linspace(0, 1, 3 * num_comp_paths).reshape(3, num_comp_paths)
+    res = (
+        [(list(features[0]), 1), (list(features[1]), 0)],
+        ["qft_3", "ghz_4"],
+        [list(scores[0]), list(scores[1])],
+    )
+    assert utils.save_training_data(res, str(path))
+    assert utils.append_training_data(
+        ([(list(features[2]), 1)], ["dj_5"], [list(scores[2])]), path
+    )
+    assert not utils.append_training_data(
+        ([(list(features[2][:-1]), 1)], ["dj_5"], [list(scores[2])]), path
+    )
+
+    # malformed training data does not replace the stored training data
+    assert not utils.save_training_data(None, str(path))
+    assert not utils.save_training_data(([([1], 0)], ["dj_3"], [[1]]), str(path))
+
+    training_data = utils.load_training_data(str(path))
+    assert len(training_data) == 3
+    assert isinstance(training_data.features, np.memmap)
+    assert training_data.features.dtype == np.float32
+    assert np.array_equal(training_data.features, features)
+    assert training_data.labels.tolist() == [1, 0, 1]
+    assert np.array_equal(training_data.scores, scores)
+    assert training_data.names.astype(str).tolist() == ["qft_3", "ghz_4", "dj_5"]
+    del training_data
+
+    assert utils.save_training_data(([], [], []), str(path))
+    assert len(utils.load_training_data(str(path))) == 0
+
+    for file in path.iterdir():
+        file.unlink()
+    path.rmdir()
 
 
 def test_calc_eval_score_for_qc():
@@ -101,3 +180,264 @@ def test_calc_eval_score_for_qc():
 
     if Path(filename_qasm).is_file():
         Path(filename_qasm).unlink()
+
+
+def test_create_feature_dicts():
+    qasm_strs = [
+        benchmark_generator.get_one_benchmark("ghz", 1, num_qubits).qasm()
+        for num_qubits in range(3, 7)
+    ]
+    qasm_strs.append("fail test")
+    expected = [utils.create_feature_dict(qasm_str) for qasm_str in qasm_strs]
+    assert (
+        list(utils.create_feature_dicts(qasm_strs, n_jobs=2, max_in_flight=2))
+        == expected
+    )
+    assert not expected[-1]
+
+    # stopping the stream early cancels the circuits still in flight
+    feature_dicts = utils.create_feature_dicts(qasm_strs, n_jobs=2, max_in_flight=3)
+    assert next(feature_dicts) == expected[0]
+    feature_dicts.close()
+
+
+def test_calc_circuit_features():
+    qc = benchmark_generator.get_one_benchmark("qft", 1, 5)
+    ops_list, depth, supermarq_features = utils.calc_circuit_features(qc)
+    assert ops_list == dict(qc.count_ops())
+    assert depth == qc.depth()
+    assert supermarq_features == utils.calc_supermarq_features(qc)
+    num_multiple_qubit_gates = qc.num_nonlocal_gates()
+    assert supermarq_features[1] == (
+        qc.depth(filter_function=lambda x: len(x[1]) > 1) / num_multiple_qubit_gates
+    )
+
+
+def test_calc_supermarq_features_program_communication():
+    qc = QuantumCircuit(4)
+    qc.h(0)
+    qc.cx(0, 1)
+    qc.barrier()
+    qc.cx(1, 2)
+    program_communication = utils.calc_supermarq_features(qc)[0]
+    # qubit 1 interacts with qubits 0 and 2, qubit 3 does not interact at all
+    assert program_communication == 4 / (4 * 3)
+
+
+def test_calc_eval_score_for_qc_from_circuit():
+    utils.init_all_config_files()
+    qc = QuantumCircuit(3, 3)
+    qc.rz(0.5, 0)
+    qc.rxx(0.5, 0, 1)
+    qc.barrier()
+    qc.measure([0, 1], [0, 1])
+
+    gate_ids, first_qubits, second_qubits = utils.get_gate_arrays(qc)
+    gate_names = utils.get_score_gate_names()
+    assert [gate_names[i] for i in gate_ids] == ["rz", "rxx", "measure", "measure"]
+    assert list(first_qubits) == [0, 0, 0, 1]
+    assert list(second_qubits) == [-1, 1, -1, -1]
+
+    ionq_calibration = utils.parse_ionq_calibration_config()
+    expected = ionq_calibration["avg_1Q"] ** 3 * ionq_calibration["avg_2Q"]
+    assert abs(utils.calc_eval_score_for_qc(qc, "ionq11") - expected) < 1e-12
+
+
+def test_calibration_snapshot():
+    calibrations = utils.get_device_calibrations()
+    devices = [
+        device_name
+        for devices in utils.get_compilation_pipeline()["devices"].values()
+        for device_name, _max_qubits in devices
+    ]
+    assert sorted(calibrations) == sorted(devices)
+    assert calibrations["ibm_montreal"].num_qubits == 27
+
+    snapshot_path = Path("calibration_snapshot.npz")
+    utils.save_calibration_snapshot(str(snapshot_path))
+    loaded_calibrations = utils.load_calibration_snapshot(str(snapshot_path))
+    # the calibrations are already built, so the snapshot is ignored
+    assert utils.get_device_calibrations(str(snapshot_path)) == calibrations
+    snapshot_path.unlink()
+    with pytest.raises(FileNotFoundError):
+        utils.get_device_calibrations(str(snapshot_path))
+    for device_name, calibration in calibrations.items():
+        assert loaded_calibrations[device_name].version == calibration.version
+
+
+def test_calc_scores():
+    calibration = utils.get_device_calibrations()["ibm_montreal"]
+    qc = QuantumCircuit(27)
+    qc.rz(0.5, 0)
+    qc.sx(1)
+    qc.cx(0, 1)
+    qc.barrier()
+    qc.x(2)
+    other_qc = QuantumCircuit(27)
+    other_qc.cx(1, 2)
+    circuits = [utils.get_gate_arrays(qc), utils.get_gate_arrays(other_qc)]
+    # an empty circuit and a circuit acting on a qubit the device does not have
+    circuits.append(tuple(np.array([], dtype=np.int64) for _ in range(3)))
+    circuits.append((np.array([0]), np.array([30]), np.array([-1])))
+
+    gate_arrays = [np.concatenate(arrays) for arrays in zip(*circuits)]
+    offsets = np.concatenate([[0], np.cumsum([len(arrays[0]) for arrays in circuits])])
+    scores = calibration.calc_scores(*gate_arrays, offsets)
+    assert len(scores) == 4
+    for score, arrays in zip(scores[:3], circuits[:3]):
+        assert score == pytest.approx(calibration.calc_score(*arrays))
+    assert scores[2] == 1
+    assert np.isnan(scores[3])
+
+
+def test_postprocess_qasm_file():
+    oqc_comp_path_index = next(
+        comp_path_index
+        for comp_path_index, comp_path in utils.get_index_to_comppath_LUT().items()
+        if comp_path[0] == "oqc"
+    )
+    qasm_str = (
+        "OPENQASM 2.0;\n"
+        'include "qelib1.inc";\n'
+        "gate rzx_0(param0) q0,q1 { h q1; }\n"
+        "gate ecr q0,q1 { rzx_0(pi/4) q0,q1; x q0; }\n"
+        "qreg q[2];\n"
+        "ecr q[0],q[1];\n"
+    )
+    postprocessed = utils.postprocess_qasm_str(qasm_str, oqc_comp_path_index)
+    lines = postprocessed.splitlines(keepends=True)
+    assert lines[2:4] == utils.get_ecr_gate_definitions()
+    assert "rzx_0" not in postprocessed
+    assert QuantumCircuit.from_qasm_str(postprocessed).count_ops() == {"ecr": 1}
+    assert utils.postprocess_qasm_str(postprocessed, oqc_comp_path_index) == (
+        postprocessed
+    )
+    assert utils.postprocess_qasm_str(qasm_str, 0) == qasm_str
+
+    qasm_path = Path("test_postprocess_" + str(oqc_comp_path_index) + ".qasm")
+    qasm_path.write_text(qasm_str)
+    utils.postprocess_qasm_file(str(qasm_path), oqc_comp_path_index)
+    assert qasm_path.read_text() == postprocessed
+    qasm_path.unlink()
+
+
+def test_create_feature_dict_from_circuit_objects():
+    qc = benchmark_generator.get_one_benchmark("ghz", 1, 4)
+    assert utils.create_feature_dict(qc) == utils.create_feature_dict(qc.qasm())
+
+    feature_dict = utils.create_feature_dict(qiskit_to_tk(qc))
+    assert feature_dict
+    assert feature_dict["num_qubits"] == qc.num_qubits
+    assert not utils.create_feature_dict(42)
+
+
+def test_timeout_worker():
+    worker = utils.TimeoutWorker()
+    result = worker.run(sum, [[1, 2, 3]], 10)
+    assert result.succeeded
+    assert result.value == 6
+    pid = worker.process.pid
+
+    result = worker.run(time.sleep, [10], 0.5)
+    assert result.status == "timeout"
+    assert result.duration < 10
+    assert worker.process is None
+
+    result = worker.run(int, ["no int"], 10)
+    assert result.status == "error"
+    assert "ValueError" in result.error
+    assert worker.process.pid != pid
+    worker.close()
+
+
+def test_timeout_executor():
+    with utils.TimeoutExecutor(max_workers=2) as executor:
+        results = executor.map(time.sleep, [[0], [10], [0]], 1)
+    assert [result.status for result in results] == ["success", "timeout", "success"]
+
+    # calls that have not started yet are cancelled on shutdown
+    executor = utils.TimeoutExecutor(max_workers=1)
+    running = executor.submit(time.sleep, [10], 20)
+    pending = executor.submit(time.sleep, [0], 20)
+    time.sleep(0.5)
+    executor.shutdown(kill=True)
+    assert pending.cancelled()
+    assert running.result().status == "error"
+    assert running.result().error == "Worker process was killed"
+
+
+def test_timeout_watcher_in_thread():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert executor.submit(utils.timeout_watcher, pow, [2, 3], 10).result() == 8
+        assert not executor.submit(
+            utils.timeout_watcher, time.sleep, [10], 0.5
+        ).result()
+
+
+def test_get_compiled_circuit_index():
+    directory = Path("test_compiled_index")
+    directory.mkdir(exist_ok=True)
+    for filename in [
+        "qft_10_0.qasm",
+        "qft_10_29.qasm",
+        "qft_100_3.qasm",
+        "qft_10_30.qasm",
+        "qft_10.txt",
+    ]:
+        (directory / filename).write_text("")
+
+    compiled_circuit_index = utils.get_compiled_circuit_index(str(directory))
+    assert sorted(compiled_circuit_index["qft_10"]) == [
+        (0, str(directory / "qft_10_0.qasm")),
+        (29, str(directory / "qft_10_29.qasm")),
+    ]
+    assert compiled_circuit_index["qft_100"] == [(3, str(directory / "qft_100_3.qasm"))]
+    assert "qft" not in compiled_circuit_index
+
+    for file in directory.iterdir():
+        file.unlink()
+    directory.rmdir()
+
+
+def test_feature_schema():
+    qc = benchmark_generator.get_one_benchmark("ghz", 1, 4)
+    assert list(utils.create_feature_dict(qc.qasm())) == utils.get_feature_names()
+
+    num_features = len(utils.get_feature_names())
+    feature_matrix = np.zeros((3, num_features))
+    feature_matrix[0, 3] = 1
+    feature_matrix[2, num_features - 1] = 0.5
+    feature_schema = utils.build_feature_schema(feature_matrix)
+    assert feature_schema.indices.tolist() == [3, num_features - 1]
+    assert feature_schema.used_feature_names == ["cx", "liveness"]
+    assert feature_schema.apply(feature_matrix).shape == (3, 2)
+
+
+def test_model_bundle():
+    training_data = utils.load_training_data()
+    feature_schema = utils.build_feature_schema(training_data.features)
+    clf = RandomForestClassifier(n_estimators=2, random_state=0).fit(
+        feature_schema.apply(training_data.features), training_data.labels
+    )
+    path = Path("test_model_bundle.joblib")
+    utils.save_classifier(clf, feature_schema, str(path))
+
+    model_bundle = utils.load_model_bundle(str(path))
+    assert model_bundle.comp_path_LUT == utils.get_index_to_comppath_LUT()
+    assert model_bundle.calibration_versions["ibm_montreal"] == (
+        utils.get_device_calibrations()["ibm_montreal"].version
+    )
+    assert model_bundle.feature_schema.indices.tolist() == (
+        feature_schema.indices.tolist()
+    )
+    assert model_bundle.get_outdated_devices() == []
+    X = feature_schema.apply(training_data.features[:10])
+    assert (model_bundle.clf.predict(X) == clf.predict(X)).all()
+
+    model_bundle.comp_path_LUT = {}
+    other_path = Path("test_model_bundle_other_LUT.joblib")
+    dump(model_bundle, str(other_path))
+    assert utils.load_model_bundle(str(other_path)) is None
+    other_path.unlink()
+    path.unlink()
+    assert utils.load_model_bundle(str(path)) is None